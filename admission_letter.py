@@ -1,30 +1,164 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from pathlib import Path
+import hashlib
 import io
+import os
+import re
+import zipfile
 
-def generate_admission_pdf(applicant):
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
+# Finished letters, one file per applicant and version of the fields below
+LETTER_CACHE_DIR = Path(__file__).parent / "letter_cache"
+
+# Everything printed on a letter; a change to any of them makes a new letter
+LETTER_FIELDS = ("id", "name", "rank", "category", "final_score", "allocated_department")
+# Bump when the layout changes so cached letters are rendered again
+LETTER_VERSION = 1
+
+# Below this many letters to render, a process pool costs more than it saves
+POOL_THRESHOLD = 20
+# Renders submitted to the pool ahead of the one being written to the ZIP
+RENDER_WINDOW = 32
+
+
+def _draw_letterhead(p):
+    # The text shared by every letter
     p.setFont("Helvetica-Bold", 24)
     p.drawCentredString(300, 750, "UNIVERSITY ADMISSION LETTER")
-    
-    p.setFont("Helvetica", 12)
-    p.drawString(100, 680, f"Application ID: {applicant.id}")
-    p.drawString(100, 660, f"Name: {applicant.name}")
-    p.drawString(100, 640, f"Rank: {applicant.rank}")
-    p.drawString(100, 620, f"Category: {applicant.category}")
-    p.drawString(100, 600, f"Final Score: {applicant.final_score:.2f}")
-    
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(100, 550, f"Allocated Department: {applicant.allocated_department}")
-    
+
     p.setFont("Helvetica", 12)
     p.drawString(100, 500, "Congratulations! Your admission has been confirmed.")
     p.drawString(100, 480, "Please report to the university campus for further instructions.")
-    
+
+
+def render_letter(fields):
+    """Renders one letter from a LETTER_FIELDS tuple and returns the PDF bytes."""
+    app_id, name, rank, category, final_score, department = fields
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=letter)
+    _draw_letterhead(p)
+
+    p.setFont("Helvetica", 12)
+    p.drawString(100, 680, f"Application ID: {app_id}")
+    p.drawString(100, 660, f"Name: {name}")
+    p.drawString(100, 640, f"Rank: {rank}")
+    p.drawString(100, 620, f"Category: {category}")
+    p.drawString(100, 600, f"Final Score: {final_score or 0:.2f}")
+
+    p.setFont("Helvetica-Bold", 14)
+    p.drawString(100, 550, f"Allocated Department: {department}")
+
     p.showPage()
     p.save()
-    
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
+
+
+def letter_fields(applicant):
+    return tuple(getattr(applicant, f) for f in LETTER_FIELDS)
+
+
+def _cache_path(fields, cache_dir):
+    digest = hashlib.sha1(repr((LETTER_VERSION, fields)).encode()).hexdigest()[:16]
+    return Path(cache_dir) / f"{fields[0]}-{digest}.pdf"
+
+
+def _cache_get(fields, cache_dir):
+    try:
+        return _cache_path(fields, cache_dir).read_bytes()
+    except FileNotFoundError:
+        return None
+
+
+def _cache_put(fields, pdf, cache_dir):
+    path = _cache_path(fields, cache_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Older versions of this applicant's letter
+    for old in path.parent.glob(f"{fields[0]}-*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(pdf)
+    os.replace(tmp, path)
+
+
+def get_letter(applicant, cache_dir=LETTER_CACHE_DIR):
+    """Returns the applicant's letter as PDF bytes, rendering it only on a cache miss."""
+    fields = letter_fields(applicant)
+    pdf = _cache_get(fields, cache_dir)
+    if pdf is None:
+        pdf = render_letter(fields)
+        _cache_put(fields, pdf, cache_dir)
+    return pdf
+
+
+def generate_admission_pdf(applicant):
+    return io.BytesIO(get_letter(applicant))
+
+
+def _letter_name(fields):
+    return f"Admission_Letter_{fields[0]}_{re.sub(r'[^A-Za-z0-9]+', '_', str(fields[1])).strip('_')}.pdf"
+
+
+class _ZipStream(io.RawIOBase):
+    # Write-only sink that hands out what zipfile has written so far
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_letters_zip(applicants, workers=None, cache_dir=LETTER_CACHE_DIR):
+    """
+    Yields a ZIP archive of the applicants' letters chunk by chunk. Cached
+    letters are reused; the rest are rendered on a process pool and cached.
+    Each cached letter is read just before it is written, and at most
+    RENDER_WINDOW renders are in flight, so memory stays bounded.
+    """
+    all_fields = [letter_fields(a) for a in applicants]
+    # A stat per letter; the PDFs themselves are only read when written
+    missing = sum(1 for f in all_fields if not _cache_path(f, cache_dir).exists())
+    pool = ProcessPoolExecutor(max_workers=workers) if missing >= POOL_THRESHOLD else None
+    inflight = deque()  # (fields, future) in submission order
+
+    def write(zf, fields, pdf):
+        zf.writestr(_letter_name(fields), pdf)
+        return sink.take()
+
+    def finish_oldest(zf):
+        fields, future = inflight.popleft()
+        pdf = future.result()
+        _cache_put(fields, pdf, cache_dir)
+        return write(zf, fields, pdf)
+
+    sink = _ZipStream()
+    try:
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for fields in all_fields:
+                pdf = _cache_get(fields, cache_dir)
+                if pdf is None and pool:
+                    inflight.append((fields, pool.submit(render_letter, fields)))
+                    if len(inflight) >= RENDER_WINDOW:
+                        yield finish_oldest(zf)
+                    continue
+                if pdf is None:
+                    pdf = render_letter(fields)
+                    _cache_put(fields, pdf, cache_dir)
+                yield write(zf, fields, pdf)
+            while inflight:
+                yield finish_oldest(zf)
+        yield sink.take()
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
@@ -1,4 +1,10 @@
-def allocate_seats(applicants, departments, waiting_list):
+import heapq
+from collections import deque
+
+
+def allocate_seats(applicants, departments, waiting_list, claim=None):
+    # claim(dept_name, category) -> bool, if given, must also succeed before a
+    # seat is assigned (e.g. storage.claim_seat when several workers allocate)
     # Sort applicants by rank before allocation
     applicants.sort(key=lambda a: a.rank if a.rank else 999999)
 
@@ -11,6 +17,10 @@ def allocate_seats(applicants, departments, waiting_list):
             if pref in departments:
                 dept = departments[pref]
                 if dept.can_admit(app.category):
+                    if claim and not claim(pref, app.category):
+                        # Another worker took the last seat in this quota
+                        dept.filled_seats[app.category] = dept.quotas.get(app.category, 0)
+                        continue
                     app.admission_status = "Selected"
                     app.allocated_department = pref
                     app.document_status = "Pending"
@@ -27,3 +37,199 @@ def allocate_seats(applicants, departments, waiting_list):
                     waiting_list.append(app)
             else:
                 app.admission_status = "Rejected"
+
+
+def allocate_seats_indexed(applicants, departments, waiting_list, claim=None):
+    """
+    Same results as allocate_seats(), built for large cohorts: remaining
+    capacity is precomputed per (department, category) so each seat check is
+    one dict lookup, the waiting list is checked through a set, and once no
+    quota is left for a category its applicants are marked Waiting or
+    Rejected without trying their preferences.
+    """
+    applicants.sort(key=lambda a: a.rank if a.rank else 999999)
+
+    remaining = {}
+    open_depts = {}  # category -> number of departments with a free seat in it
+    for name, dept in departments.items():
+        for category, quota in dept.quotas.items():
+            free = quota - dept.filled_seats.get(category, 0)
+            remaining[(name, category)] = free
+            if free > 0:
+                open_depts[category] = open_depts.get(category, 0) + 1
+
+    waiting_ids = {id(a) for a in waiting_list}
+    has_valid_pref = {}  # preferences tuple -> any preference is a known department
+
+    def take_seat(name, category):
+        remaining[(name, category)] -= 1
+        if remaining[(name, category)] == 0:
+            open_depts[category] -= 1
+
+    for app in applicants:
+        if app.admission_status != "Applied":
+            continue
+
+        allocated = False
+        if open_depts.get(app.category):
+            for pref in app.preferences:
+                if remaining.get((pref, app.category), 0) > 0:
+                    if claim and not claim(pref, app.category):
+                        # Another worker took the last seat in this quota
+                        departments[pref].filled_seats[app.category] = departments[pref].quotas[app.category]
+                        remaining[(pref, app.category)] = 0
+                        open_depts[app.category] -= 1
+                        continue
+                    app.admission_status = "Selected"
+                    app.allocated_department = pref
+                    app.document_status = "Pending"
+                    departments[pref].filled_seats[app.category] += 1
+                    take_seat(pref, app.category)
+                    allocated = True
+                    break
+
+        if not allocated:
+            prefs = tuple(app.preferences)
+            valid = has_valid_pref.get(prefs)
+            if valid is None:
+                valid = has_valid_pref[prefs] = any(p in departments for p in prefs)
+            if valid:
+                app.admission_status = "Waiting"
+                if id(app) not in waiting_ids:
+                    waiting_ids.add(id(app))
+                    waiting_list.append(app)
+            else:
+                app.admission_status = "Rejected"
+
+
+# Candidates who can still move to a better seat
+FLOATING = ("Applied", "Waiting", "Selected")
+
+
+class Counselling:
+    """
+    Multi-round counselling. Selected candidates float up to a higher
+    preference when a seat frees there, and waiting candidates move in.
+
+    Every seat that becomes free (a withdrawal, added seats or a candidate
+    floating away) is offered to the best-ranked candidate of that category
+    who prefers it to what they hold, and the seat that candidate leaves is
+    offered on in turn. A round only follows these vacancy chains, so after
+    the one-off index build it costs time proportional to the seats that
+    moved. Each seat holder can only improve, so an index entry that no
+    longer wants its seat is dropped for good.
+
+    Confirmed candidates keep their seat. The first round also places all
+    Applied candidates and gives the same result as allocate_seats().
+
+    By default the first round offers every free seat. A caller that knows
+    which seats were freed or added since the previous round passes them as
+    `vacancies` and then needs to load only the floating candidates of
+    those categories; seats are still offered everywhere for categories
+    with Applied candidates.
+    """
+
+    def __init__(self, applicants, departments, claim=None, release=None, vacancies=None):
+        # claim works as in allocate_seats; release(dept_name, category) is
+        # called when a candidate gives a seat back
+        self.departments = departments
+        self.claim = claim
+        self.release = release
+        self.rounds = []  # one diff per round: [(applicant, from_dept, to_dept)]
+        self._applied = [a for a in applicants if a.admission_status == "Applied"]
+
+        # (department, category) -> heap of (rank, seq, preference position, applicant)
+        self._heaps = {}
+        for seq, app in enumerate(applicants):
+            if app.admission_status not in FLOATING:
+                continue
+            rank_key = app.rank if app.rank else 999999
+            current = self._position(app)
+            for pos, pref in enumerate(dict.fromkeys(app.preferences)):
+                if pos >= current:
+                    break
+                if pref in departments:
+                    self._heaps.setdefault((pref, app.category), []).append((rank_key, seq, pos, app))
+        for heap in self._heaps.values():
+            heapq.heapify(heap)
+
+        if vacancies is None:
+            # Every seat free now is offered in the first round
+            self._pending = [(name, c) for name, dept in departments.items() for c in dept.quotas]
+        else:
+            applied_categories = {a.category for a in self._applied}
+            self._pending = list(vacancies) + [
+                (name, c) for name, dept in departments.items() for c in dept.quotas if c in applied_categories
+            ]
+
+    def _position(self, app):
+        # Preference index of the seat held, len(preferences) when none
+        prefs = list(dict.fromkeys(app.preferences))
+        if app.admission_status == "Selected" and app.allocated_department in prefs:
+            return prefs.index(app.allocated_department)
+        return len(prefs)
+
+    def withdraw(self, app, status="Cancelled"):
+        """Takes a candidate out of counselling; their seat is offered next round."""
+        dept_name = app.allocated_department
+        if app.admission_status in ("Selected", "Confirmed") and dept_name in self.departments:
+            self.departments[dept_name].filled_seats[app.category] -= 1
+            if self.release:
+                self.release(dept_name, app.category)
+            self._pending.append((dept_name, app.category))
+        app.admission_status = status
+        app.allocated_department = None
+
+    def add_seats(self, dept_name, category, count=1):
+        dept = self.departments[dept_name]
+        dept.quotas[category] = dept.quotas.get(category, 0) + count
+        dept.total_seats += count
+        self._pending.append((dept_name, category))
+
+    def run_round(self):
+        """Fills the seats freed since the last round and returns the diff."""
+        moves = {}  # id(applicant) -> (applicant, department held before this round)
+        queue = deque(self._pending)
+        self._pending = []
+        while queue:
+            dept_name, category = queue.popleft()
+            dept = self.departments.get(dept_name)
+            heap = self._heaps.get((dept_name, category))
+            while dept and heap and dept.can_admit(category):
+                _, _, pos, app = heap[0]
+                if app.admission_status not in FLOATING or self._position(app) <= pos:
+                    heapq.heappop(heap)
+                    continue
+                if self.claim and not self.claim(dept_name, category):
+                    dept.filled_seats[category] = dept.quotas.get(category, 0)
+                    break
+                heapq.heappop(heap)
+                old = app.allocated_department if app.admission_status == "Selected" else None
+                moves.setdefault(id(app), (app, old))
+                if old:
+                    self.departments[old].filled_seats[category] -= 1
+                    if self.release:
+                        self.release(old, category)
+                    queue.append((old, category))
+                else:
+                    app.admission_status = "Selected"
+                    app.document_status = "Pending"
+                app.allocated_department = dept_name
+                dept.filled_seats[category] += 1
+
+        # Applied candidates left without a seat, as in allocate_seats
+        for app in self._applied:
+            if app.admission_status == "Applied":
+                if any(p in self.departments for p in app.preferences):
+                    app.admission_status = "Waiting"
+                else:
+                    app.admission_status = "Rejected"
+        self._applied = []
+
+        diff = [
+            (app, old, app.allocated_department)
+            for app, old in moves.values()
+            if old != app.allocated_department
+        ]
+        self.rounds.append(diff)
+        return diff
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the ranking, allocation, reallocation and storage paths on
+synthetic cohorts.
+
+    python -m benchmarks --sizes 10000 100000 1000000 --out results.json
+"""
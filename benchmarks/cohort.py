@@ -0,0 +1,65 @@
+"""
+Seeded synthetic cohorts and seat matrices. The same seed and size always
+give the same applicants, so results can be compared between versions.
+"""
+import numpy as np
+
+from models import Applicant, Department
+
+# Share of applicants, and of seats, per category (reservation-style split)
+CATEGORY_SHARES = {"General": 0.405, "OBC": 0.27, "SC": 0.15, "ST": 0.075, "EWS": 0.10}
+
+# In order of popularity
+DEPARTMENT_NAMES = ("CS", "IT", "ECE", "EE", "MECH", "CIVIL", "CHEM", "AERO", "BIO", "META")
+
+# How many departments an applicant lists (1 to 5)
+PREFERENCE_COUNTS = (0.15, 0.25, 0.3, 0.2, 0.1)
+
+
+def _popularity(count):
+    weights = 1.0 / np.arange(1, count + 1)
+    return weights / weights.sum()
+
+
+def make_departments(size, seat_ratio=0.1, count=len(DEPARTMENT_NAMES)):
+    """
+    Seat matrix for a cohort of `size`: about seat_ratio * size seats, more of
+    them in the popular departments, split into category quotas.
+    """
+    names = DEPARTMENT_NAMES[:count]
+    total = max(int(size * seat_ratio), count)
+    departments = {}
+    for name, weight in zip(names, _popularity(count)):
+        seats = max(int(total * weight), 1)
+        quotas = {c: int(seats * share) for c, share in CATEGORY_SHARES.items()}
+        quotas["General"] += seats - sum(quotas.values())
+        departments[name] = Department(name, seats, quotas)
+    return departments
+
+
+def make_cohort(size, departments, seed=0):
+    """Returns `size` unranked Applicants with ids 1..size."""
+    rng = np.random.default_rng(seed)
+    categories = rng.choice(list(CATEGORY_SHARES), size=size, p=list(CATEGORY_SHARES.values()))
+
+    # Entrance scores follow 12th marks loosely
+    aptitude = rng.standard_normal(size)
+    marks = np.clip(72 + 12 * aptitude, 33, 100).round(2)
+    entrance = np.clip(55 + 20 * (0.6 * aptitude + 0.8 * rng.standard_normal(size)), 0, 100).round(2)
+    ages = rng.choice(np.arange(17, 22), size=size, p=(0.1, 0.45, 0.3, 0.1, 0.05))
+
+    # Weighted sampling without replacement (Gumbel top-k): popular
+    # departments are listed more often and earlier
+    names = list(departments)
+    keys = np.log(_popularity(len(names))) + rng.gumbel(size=(size, len(names)))
+    order = np.argsort(-keys, axis=1)
+    counts = rng.choice(np.arange(1, len(PREFERENCE_COUNTS) + 1), size=size, p=PREFERENCE_COUNTS)
+    counts = np.minimum(counts, len(names))
+
+    cohort = []
+    for i, (row, k) in enumerate(zip(order.tolist(), counts.tolist())):
+        cohort.append(Applicant(
+            i + 1, f"Applicant {i + 1}", int(ages[i]), float(marks[i]), float(entrance[i]),
+            [names[j] for j in row[:k]], str(categories[i]),
+        ))
+    return cohort
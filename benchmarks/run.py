@@ -0,0 +1,206 @@
+"""
+Times each stage of an admission cycle on synthetic cohorts and writes the
+results as JSON. The storage stages run against a temporary SQLite file.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import numpy as np
+
+import storage as db
+from models import Department
+from ranking import generate_merit_list, merit_arrays
+from allocation import allocate_seats, allocate_seats_indexed
+from verification import reallocate_waiting, release_seats
+from benchmarks.cohort import make_cohort, make_departments
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Recorder:
+    def __init__(self, trace_memory=False):
+        # tracemalloc slows Python code down noticeably, so it is opt-in
+        self.trace_memory = trace_memory
+        self.results = []
+
+    @contextmanager
+    def stage(self, size, name, **extra):
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        yield
+        entry = {"size": size, "stage": name, "seconds": round(time.perf_counter() - start, 4)}
+        entry.update(extra)
+        entry["max_rss_mb"] = _max_rss_mb()
+        if self.trace_memory:
+            entry["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            tracemalloc.stop()
+        self.results.append(entry)
+        print(f"{size:>9} {name:<36} {entry['seconds']:>9.3f}s", file=sys.stderr)
+
+
+def _fresh(departments):
+    return {n: Department(n, d.total_seats, dict(d.quotas)) for n, d in departments.items()}
+
+
+def _reset(cohort):
+    for a in cohort:
+        a.admission_status = "Applied"
+        a.allocated_department = None
+        a.document_status = "Pending"
+
+
+def bench_size(size, rec, workdir, seed=0, freed=100, inserts=2000, reference_limit=100_000):
+    departments = make_departments(size)
+    with rec.stage(size, "generate_cohort"):
+        cohort = make_cohort(size, departments, seed)
+
+    # Ranking
+    rows = [(a.id, a.marks_12, a.entrance_score, a.age, a.category) for a in cohort]
+    with rec.stage(size, "ranking.merit_arrays"):
+        merit = merit_arrays(rows)
+    with rec.stage(size, "ranking.generate_merit_list"):
+        generate_merit_list(cohort)
+
+    # Allocation, each run from empty seats
+    # allocate_seats checks the waiting list by scanning it, which is
+    # quadratic; past reference_limit it would dominate the whole run
+    if size <= reference_limit:
+        with rec.stage(size, "allocation.allocate_seats"):
+            allocate_seats(cohort, _fresh(departments), [])
+        _reset(cohort)
+    else:
+        rec.results.append({"size": size, "stage": "allocation.allocate_seats", "skipped": True})
+    allocated = _fresh(departments)
+    waiting = []
+    with rec.stage(size, "allocation.allocate_seats_indexed"):
+        allocate_seats_indexed(cohort, allocated, waiting)
+
+    # Reallocation: cancel `freed` random selections, then refill the seats
+    selected = [a for a in cohort if a.admission_status == "Selected"]
+    rng = np.random.default_rng(seed)
+    freed_pairs = []
+    for i in rng.choice(len(selected), size=min(freed, len(selected)), replace=False).tolist():
+        a = selected[i]
+        allocated[a.allocated_department].filled_seats[a.category] -= 1
+        freed_pairs.append((a.allocated_department, a.category))
+        a.admission_status, a.allocated_department = "Cancelled", None
+    saved = [(a, a.admission_status, a.allocated_department, a.document_status) for a in waiting]
+    saved_filled = {n: dict(d.filled_seats) for n, d in allocated.items()}
+
+    with rec.stage(size, "verification.reallocate_waiting", freed=len(freed_pairs)):
+        waiting_copy = list(waiting)
+        for _ in freed_pairs:
+            reallocate_waiting(allocated, waiting_copy)
+    for a, status, dept, doc in saved:
+        a.admission_status, a.allocated_department, a.document_status = status, dept, doc
+    for n, filled in saved_filled.items():
+        allocated[n].filled_seats = filled
+    with rec.stage(size, "verification.release_seats", freed=len(freed_pairs)):
+        release_seats(allocated, list(waiting), freed_pairs)
+
+    # Storage, on a throwaway database; ids match the cohort's
+    path = os.path.join(workdir, f"bench_{size}.db")
+    db.init_db(path)
+    db.seed_departments(departments, path=path)
+    cohort.sort(key=lambda a: a.id)
+    head = cohort[:min(inserts, size)]
+    with rec.stage(size, "storage.add_applicant", rows=len(head)):
+        for a in head:
+            db.add_applicant(a.name, a.age, a.marks_12, a.entrance_score, a.preferences, a.category, path=path)
+    with rec.stage(size, "setup.bulk_insert", rows=size - len(head)):
+        with db.transaction(path) as conn:
+            conn.executemany(
+                "INSERT INTO applicants(id, name, age, marks_12, entrance_score, preferences, category, "
+                "admission_status, document_status, fee_status, ocr_verified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'Applied', 'Pending', 'Unpaid', 0)",
+                ((a.id, a.name, a.age, a.marks_12, a.entrance_score, ",".join(a.preferences), a.category)
+                 for a in cohort[len(head):]),
+            )
+    with rec.stage(size, "storage.rank_applicants_sql"):
+        db.rank_applicants_sql(path=path)
+    ids, final_score, rank, category_rank = merit
+    with rec.stage(size, "storage.update_applicant_columns"):
+        db.update_applicant_columns(
+            ids, {"final_score": final_score, "rank": rank, "category_rank": category_rank}, path=path
+        )
+    with rec.stage(size, "storage.update_applicants_bulk"):
+        db.update_applicants_bulk(
+            cohort, fields=("admission_status", "allocated_department", "document_status"), path=path
+        )
+    with rec.stage(size, "storage.iter_applicants"):
+        for _ in db.iter_applicants(columns=("rank", "admission_status"), order_by_rank=True, as_tuples=True, path=path):
+            pass
+    db.close_connections()
+
+
+def _git_revision():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--freed", type=int, default=100, help="seats freed for the reallocation stages")
+    parser.add_argument("--inserts", type=int, default=2000, help="rows written one by one through add_applicant")
+    parser.add_argument("--reference-limit", type=int, default=100_000,
+                        help="largest size the quadratic allocate_seats is timed at")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the tracemalloc peak per stage")
+    parser.add_argument("--out", help="write JSON here instead of stdout")
+    args = parser.parse_args(argv)
+
+    rec = Recorder(args.trace_memory)
+    workdir = tempfile.mkdtemp(prefix="admissions-bench-")
+    try:
+        for size in args.sizes:
+            bench_size(size, rec, workdir, seed=args.seed, freed=args.freed, inserts=args.inserts,
+                       reference_limit=args.reference_limit)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "sqlite": sqlite3.sqlite_version,
+            "seed": args.seed,
+            "trace_memory": args.trace_memory,
+        },
+        "results": rec.results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,68 @@
+"""
+Applicant exports that run in bounded memory: rows come from
+storage.iter_applicants() chunk by chunk and go straight out, either as a
+CSV generator or through an openpyxl write-only workbook.
+"""
+import csv
+import io
+import tempfile
+
+from openpyxl import Workbook
+
+# Exportable columns and their headers, in export order
+EXPORT_COLUMNS = {
+    'id': 'ID',
+    'name': 'Name',
+    'age': 'Age',
+    'marks_12': '12th Marks',
+    'entrance_score': 'Entrance',
+    'final_score': 'Final Score',
+    'category': 'Category',
+    'rank': 'Rank',
+    'category_rank': 'Category Rank',
+    'admission_status': 'Status',
+    'allocated_department': 'Department',
+    'document_status': 'Documents',
+    'fee_status': 'Fee Status',
+    'payment_id': 'Payment ID',
+}
+DEFAULT_EXPORT_COLUMNS = (
+    'id', 'name', 'age', 'marks_12', 'entrance_score', 'category', 'rank',
+    'admission_status', 'allocated_department', 'fee_status',
+)
+
+
+def select_columns(requested):
+    # Keeps the known columns, in export order; falls back to the defaults
+    chosen = [c for c in EXPORT_COLUMNS if c in set(requested or ())]
+    return chosen or list(DEFAULT_EXPORT_COLUMNS)
+
+
+def iter_csv(rows, columns, flush_every=1000):
+    """Yields CSV text for `rows` (tuples aligned with `columns`) in chunks."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([EXPORT_COLUMNS[c] for c in columns])
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % flush_every == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def write_xlsx(rows, columns):
+    """
+    Writes `rows` to an anonymous temporary file through a write-only
+    workbook and returns it rewound; it is deleted once closed.
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Applicants")
+    ws.append([EXPORT_COLUMNS[c] for c in columns])
+    for row in rows:
+        ws.append(row)
+    out = tempfile.TemporaryFile()
+    wb.save(out)
+    out.seek(0)
+    return out
@@ -0,0 +1,107 @@
+"""
+Background jobs. Routes queue work in the jobs table and return at once;
+worker threads claim jobs from the table, run the handler registered for
+their kind and record its stage and percent as they go. Claiming goes
+through the database, so several web processes can share one queue.
+"""
+import os
+import threading
+import traceback
+from contextlib import nullcontext
+
+import storage as db
+
+_handlers = {}
+_lock_keys = {}
+
+
+def handler(kind, lock_key=None):
+    # Registers func(job, progress) to run jobs of `kind`; progress(stage, percent).
+    # Kinds registered with the same lock_key never run at the same time
+    def register(func):
+        _handlers[kind] = func
+        _lock_keys[kind] = lock_key
+        return func
+    return register
+
+
+class JobRunner:
+    def __init__(self, workers=1, poll_interval=1.0, context=None, heartbeat=60.0, path=db.DB_PATH):
+        # context: callable returning a context manager to run each job in,
+        # e.g. app.app_context. heartbeat: seconds between renewals of a
+        # running job, well under claim_job's stale_after
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.context = context
+        self.path = path
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    def submit(self, kind, created_by=None):
+        """Queues a job and returns (job_id, created); see storage.enqueue_job."""
+        if kind not in _handlers:
+            raise ValueError(f"No handler for job kind: {kind}")
+        job_id, created = db.enqueue_job(kind, created_by, lock_key=_lock_keys[kind], path=self.path)
+        self.start()
+        self._wake.set()
+        return job_id, created
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive a fork
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._threads = []
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                t = threading.Thread(target=self._run, name="job-worker", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _run(self):
+        while True:
+            try:
+                job = db.claim_job(path=self.path)
+            except Exception:
+                traceback.print_exc()
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._execute(job)
+
+    def _execute(self, job):
+        def progress(stage, percent):
+            db.update_job(job["id"], stage=stage, percent=int(percent), path=self.path)
+
+        # Renews the job while the handler runs, so a long stage between two
+        # progress calls is not taken for a dead worker
+        finished = threading.Event()
+        beat = threading.Thread(target=self._heartbeat, args=(job["id"], finished), name="job-heartbeat", daemon=True)
+        beat.start()
+        try:
+            with self.context() if self.context else nullcontext():
+                _handlers[job["kind"]](job, progress)
+        except Exception as e:
+            traceback.print_exc()
+            result = dict(status="failed", error=str(e) or type(e).__name__)
+        else:
+            result = dict(status="done", stage="Done", percent=100)
+        finally:
+            finished.set()
+            beat.join()
+        if not db.update_job(job["id"], path=self.path, **result):
+            print(f"Job {job['id']} ({job['kind']}) was failed as stale before it finished")
+
+    def _heartbeat(self, job_id, finished):
+        while not finished.wait(self.heartbeat):
+            try:
+                if not db.update_job(job_id, path=self.path):
+                    return
+            except Exception:
+                # e.g. the database stayed locked; the next beat tries again
+                traceback.print_exc()
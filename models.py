@@ -11,11 +11,14 @@ class Applicant:
         # Computed / Dynamic
         self.final_score = 0
         self.rank = None
+        self.category_rank = None
         self.allocated_department = None
         self.admission_status = "Applied"   # Applied | Selected | Waiting | Rejected | Cancelled | Confirmed
         self.document_status = "Pending"    # Pending | Verified | Rejected
         self.fee_status = "Unpaid"          # Unpaid | Paid
         self.ocr_verified = False
+        self.ocr_status = None            # Last OCR run, see storage.queue_ocr
+        self.ocr_marks = None             # Marks OCR read from the marksheet
         self.payment_id = None
         self.marksheet_path = None
         self.scorecard_path = None
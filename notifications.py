@@ -1,9 +1,20 @@
+import os
+import time
+import threading
+import traceback
+from contextlib import nullcontext
 from flask_mail import Message
 
-def notify(event, applicant, mail=None):
+import storage as db
+
+# Applicants have no email column yet
+DEFAULT_RECIPIENT = "student@example.com"
+
+
+def compose(event, applicant):
     subject = f"University Admission Update: {event}"
     body = f"Dear {applicant.name},\n\n"
-    
+
     if event == "SELECTED":
         body += f"Congratulations! You have been selected for admission in the {applicant.allocated_department} department. Please log in to verify your documents."
     elif event == "CONFIRMED":
@@ -14,12 +25,107 @@ def notify(event, applicant, mail=None):
         body += "You are currently on the waiting list. We will notify you if a seat becomes available."
 
     body += "\n\nBest regards,\nUniversity Admission Team"
+    return subject, body
+
+
+def notify(event, applicant, mail=None):
+    notify_many(event, [applicant], mail)
+
+
+def notify_many(event, applicants, mail=None):
+    # With mail, the messages are queued in the outbox and sent by OutboxSender
+    messages = []
+    for applicant in applicants:
+        subject, body = compose(event, applicant)
+        print(f"[MOCK EMAIL to {applicant.name}] Subject: {subject}")
+        messages.append((DEFAULT_RECIPIENT, subject, body))
+
+    if mail and messages:
+        db.queue_messages(messages)
+        if _sender:
+            _sender.wake()
+
+
+_sender = None
+
+
+class OutboxSender:
+    """
+    Background thread draining the outbox: each batch of due messages goes
+    out over one mail.connect() session. A failed message is retried after
+    backoff * 2 ** (attempts - 1) seconds, up to max_attempts.
+    """
+
+    def __init__(self, mail, context=None, batch_size=50, poll_interval=2.0, max_attempts=5, backoff=30, path=db.DB_PATH):
+        # context: callable returning a context manager to send in, e.g. app.app_context
+        global _sender
+        self.mail = mail
+        self.context = context
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.path = path
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        _sender = self
+
+    def wake(self):
+        self.start()
+        self._wake.set()
+
+    def start(self):
+        with self._lock:
+            # Threads do not survive a fork
+            if self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="outbox-sender", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                sent = self.send_batch()
+            except Exception:
+                traceback.print_exc()
+                sent = 0
+            if not sent:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def send_batch(self):
+        """Sends one batch of due messages; returns how many were taken."""
+        rows = db.claim_outbox_batch(self.batch_size, path=self.path)
+        if not rows:
+            return 0
+        sent, failures = [], []
+
+        def failed(row, error):
+            retry_at = time.time() + self.backoff * 2 ** row[4]
+            failures.append((row[0], str(error) or type(error).__name__, retry_at))
 
-    print(f"[MOCK EMAIL to {applicant.name}] Subject: {subject}")
-    
-    if mail:
         try:
-            msg = Message(subject, recipients=["student@example.com"], body=body) # In real app, use applicant.email
-            mail.send(msg)
+            with self.context() if self.context else nullcontext():
+                with self.mail.connect() as conn:
+                    for row in rows:
+                        msg_id, recipient, subject, body, _ = row
+                        try:
+                            conn.send(Message(subject, recipients=[recipient], body=body))
+                            sent.append(msg_id)
+                        except Exception as e:
+                            failed(row, e)
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            # Could not connect (or the session broke): retry whatever was not sent
+            done = set(sent) | {f[0] for f in failures}
+            for row in rows:
+                if row[0] not in done:
+                    failed(row, e)
+
+        if sent:
+            db.mark_outbox_sent(sent, path=self.path)
+        if failures:
+            db.mark_outbox_failed(failures, self.max_attempts, path=self.path)
+            print(f"Failed to send {len(failures)} emails: {failures[0][1]}")
+        return len(rows)
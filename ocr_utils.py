@@ -1,5 +1,7 @@
 import pytesseract
 from PIL import Image
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
 import re
 import os
 
@@ -10,35 +12,49 @@ tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 if os.path.exists(tesseract_cmd):
     pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
 
-def extract_marks_from_image(image_path):
+def read_marks(image_path):
     """
-    Attempts to extract marks from an image using OCR.
-    This is a simplified version for demonstration.
+    Extracts the marks from an image using OCR; None when the text has no
+    marks in it. Errors (unreadable file, no tesseract) are raised.
     """
+    text = pytesseract.image_to_string(Image.open(image_path))
+    # Look for patterns like "Total Marks: 95" or "Percentage: 95.5"
+    marks_match = re.search(r'(?:Marks|Total|Percentage|Score)\D*(\d+(?:\.\d+)?)', text, re.IGNORECASE)
+    if marks_match:
+        return float(marks_match.group(1))
+    return None
+
+def marks_agree(extracted_marks, form_marks):
+    # Allow a small margin of error or exact match
+    return extracted_marks is not None and abs(extracted_marks - form_marks) < 1.0
+
+def content_hash(path):
+    """SHA-256 of a file's bytes; OCR results are cached under it."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_marks_in_worker(image_path):
+    # Errors go back as text: some pytesseract exceptions cannot be unpickled,
+    # which would break the whole pool
     try:
-        text = pytesseract.image_to_string(Image.open(image_path))
-        # Look for patterns like "Total Marks: 95" or "Percentage: 95.5"
-        marks_match = re.search(r'(?:Marks|Total|Percentage|Score)\D*(\d+(?:\.\d+)?)', text, re.IGNORECASE)
-        if marks_match:
-            return float(marks_match.group(1))
-        return None
+        return read_marks(image_path), None
     except Exception as e:
-        print(f"OCR Error: {e}")
-        return None
+        return None, str(e) or type(e).__name__
 
-def verify_applicant_marks(applicant):
+def read_marks_many(paths, workers=None):
     """
-    Verifies if the marks entered by the applicant match the document.
+    Runs read_marks over `paths` on a process pool (tesseract is CPU-bound)
+    and yields (path, marks, error) as each one finishes; error is a message
+    or None.
     """
-    if not applicant.marksheet_path or not os.path.exists(applicant.marksheet_path):
-        return False, "Marksheet not found"
-    
-    extracted_marks = extract_marks_from_image(applicant.marksheet_path)
-    if extracted_marks is None:
-        return False, "Could not read marks from document"
-    
-    # Allow a small margin of error or exact match
-    if abs(extracted_marks - applicant.marks_12) < 1.0:
-        return True, "Marks verified successfully"
-    else:
-        return False, f"Marks mismatch: Form says {applicant.marks_12}, Document says {extracted_marks}"
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_read_marks_in_worker, p): p for p in paths}
+        try:
+            for future in as_completed(futures):
+                yield (futures[future],) + future.result()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -1,9 +1,26 @@
+import numpy as np
+from sortedcontainers import SortedList
+
+# Weights of the final score (real-world style)
+MARKS_WEIGHT = 0.6
+ENTRANCE_WEIGHT = 0.4
+
+COHORT_DTYPE = np.dtype([
+    ("id", np.int64),
+    ("marks_12", np.float64),
+    ("entrance_score", np.float64),
+    ("age", np.int64),
+    ("category", "U16"),
+])
+
+
 def calculate_final_score(applicant):
     # Weighted formula (real-world style)
-    return (applicant.marks_12 * 0.6) + (applicant.entrance_score * 0.4)
+    return (applicant.marks_12 * MARKS_WEIGHT) + (applicant.entrance_score * ENTRANCE_WEIGHT)
 
 
 def generate_merit_list(applicants):
+    # Object-based reference implementation of rank_arrays()
     for app in applicants:
         app.final_score = calculate_final_score(app)
 
@@ -16,3 +33,70 @@ def generate_merit_list(applicants):
 
     for idx, app in enumerate(applicants, start=1):
         app.rank = idx
+
+
+def rank_arrays(marks_12, entrance_score, age):
+    """
+    Vectorized generate_merit_list(): returns (final_score, rank) arrays
+    aligned with the inputs. Ties are broken by age, then by input order,
+    exactly like the stable sort of the reference implementation.
+    """
+    final_score = marks_12 * MARKS_WEIGHT + entrance_score * ENTRANCE_WEIGHT
+    # lexsort sorts by the last key first and is stable
+    order = np.lexsort((-age, -final_score))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(1, len(order) + 1)
+    return final_score, rank
+
+
+def category_rank_array(rank, category):
+    # Rank within each category, following the overall rank order
+    codes = np.unique(category, return_inverse=True)[1]
+    order = np.lexsort((rank, codes))
+    sorted_codes = codes[order]
+    starts = np.r_[0, np.flatnonzero(np.diff(sorted_codes)) + 1]
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    category_rank = np.empty(len(order), dtype=np.int64)
+    category_rank[order] = np.arange(len(order)) - group_start + 1
+    return category_rank
+
+
+def merit_arrays(rows):
+    """
+    Ranks a cohort given as (id, marks_12, entrance_score, age, category)
+    tuples, e.g. from storage.iter_applicants(..., as_tuples=True). Returns
+    (ids, final_score, rank, category_rank) arrays ready for a bulk write.
+    """
+    cohort = np.fromiter(rows, dtype=COHORT_DTYPE)
+    final_score, rank = rank_arrays(cohort["marks_12"], cohort["entrance_score"], cohort["age"])
+    return cohort["id"], final_score, rank, category_rank_array(rank, cohort["category"])
+
+
+class MeritIndex:
+    """
+    Order-statistics index over the cohort keyed by (-final_score, -age, id),
+    the merit order of generate_merit_list(). Inserting, moving and ranking
+    one applicant are O(log n), so ranks stay current between full
+    regenerations.
+    """
+
+    def __init__(self):
+        self._keys = SortedList()
+        self._by_id = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def upsert(self, app_id, final_score, age):
+        old = self._by_id.get(app_id)
+        if old is not None:
+            self._keys.remove(old)
+        key = (-(final_score or 0.0), -(age or 0), app_id)
+        self._keys.add(key)
+        self._by_id[app_id] = key
+
+    def rank_of(self, app_id):
+        key = self._by_id.get(app_id)
+        if key is None:
+            return None
+        return self._keys.index(key) + 1
@@ -0,0 +1,183 @@
+"""
+What-if seat-matrix simulator.
+
+Loads the ranked cohort from the database once, shares it read-only with a
+pool of worker processes through shared memory, and runs a fresh seat
+allocation for every candidate seat matrix. Nothing is written back to the
+database.
+
+    python simulation.py scenarios.json
+
+where scenarios.json maps a scenario name to its departments:
+
+    {"more-cs": {"CS": {"total_seats": 12, "quotas": {"General": 6, "OBC": 4, "SC": 2}},
+                 "MECH": {"total_seats": 5, "quotas": {"General": 3, "OBC": 2}}}}
+"""
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import storage as db
+from models import Department
+from allocation import allocate_seats_indexed
+
+
+class SimApplicant:
+    # The fields allocate_seats_indexed() reads and writes
+    __slots__ = ("id", "rank", "preferences", "category", "admission_status", "allocated_department", "document_status")
+
+    def __init__(self, app_id, rank, preferences, category):
+        self.id = app_id
+        self.rank = rank
+        self.preferences = preferences
+        self.category = category
+        self.admission_status = "Applied"
+        self.allocated_department = None
+        self.document_status = "Pending"
+
+
+def load_cohort(path=db.DB_PATH):
+    """
+    Reads the cohort into NumPy arrays: ids, ranks (0 when unranked),
+    category codes and a padded matrix of preference codes (-1 = none),
+    plus the category and department names the codes refer to.
+    """
+    ids, ranks, categories, preferences = [], [], [], []
+    category_codes, department_codes = {}, {}
+    rows = db.iter_applicants(columns=("rank", "preferences", "category"), as_tuples=True, path=path)
+    for (app_id, rank, prefs_str, category) in rows:
+        ids.append(app_id)
+        ranks.append(rank or 0)
+        categories.append(category_codes.setdefault(category, len(category_codes)))
+        prefs = prefs_str.split(",") if prefs_str else []
+        preferences.append([department_codes.setdefault(p, len(department_codes)) for p in prefs])
+
+    width = max((len(p) for p in preferences), default=0)
+    pref_matrix = np.full((len(ids), width), -1, dtype=np.int32)
+    for i, prefs in enumerate(preferences):
+        pref_matrix[i, :len(prefs)] = prefs
+    arrays = {
+        "id": np.array(ids, dtype=np.int64),
+        "rank": np.array(ranks, dtype=np.int64),
+        "category": np.array(categories, dtype=np.int32),
+        "preferences": pref_matrix,
+    }
+    return arrays, list(category_codes), list(department_codes)
+
+
+def _share(array):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+# Per-worker copy of the cohort, decoded once from shared memory
+_cohort = None
+
+
+def _attach(specs, category_names, department_names):
+    global _cohort
+    arrays = {}
+    handles = []
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        handles.append(shm)
+        arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+    pref_names = [
+        tuple(department_names[c] for c in row if c >= 0)
+        for row in arrays["preferences"].tolist()
+    ]
+    _cohort = [
+        (app_id, rank or None, pref_names[i], category_names[cat])
+        for i, (app_id, rank, cat) in enumerate(zip(
+            arrays["id"].tolist(), arrays["rank"].tolist(), arrays["category"].tolist()
+        ))
+    ]
+    # Views must go before the blocks can be closed
+    del arrays
+    for shm in handles:
+        shm.close()
+
+
+def run_scenario(name, dept_specs):
+    """
+    Allocates the shared cohort against one seat matrix, everybody starting
+    as Applied with empty seats. dept_specs: {dept: (total_seats, quotas)}.
+    """
+    departments = {d: Department(d, total, dict(quotas)) for d, (total, quotas) in dept_specs.items()}
+    applicants = [SimApplicant(app_id, rank, list(prefs), category) for (app_id, rank, prefs, category) in _cohort]
+    waiting_list = []
+    allocate_seats_indexed(applicants, departments, waiting_list)
+
+    cutoffs = {}
+    for a in applicants:
+        if a.admission_status == "Selected" and a.rank:
+            key = (a.allocated_department, a.category)
+            cutoffs[key] = max(cutoffs.get(key, 0), a.rank)
+
+    summary = {"departments": {}, "selected": 0, "waiting": len(waiting_list), "rejected": 0}
+    for a in applicants:
+        if a.admission_status == "Selected":
+            summary["selected"] += 1
+        elif a.admission_status == "Rejected":
+            summary["rejected"] += 1
+    for d, dept in departments.items():
+        filled = {c: n for c, n in dept.filled_seats.items() if n}
+        summary["departments"][d] = {
+            "total_seats": dept.total_seats,
+            "filled": sum(filled.values()),
+            "filled_by_category": filled,
+            # Rank of the last candidate admitted per category
+            "cutoff_rank": {c: cutoffs[(d, c)] for c in dept.quotas if (d, c) in cutoffs},
+        }
+    return name, summary
+
+
+def simulate(scenarios, path=db.DB_PATH, max_workers=None):
+    """
+    Runs every scenario ({name: {dept: Department}}) against the cohort in
+    `path` and returns {name: summary}. With max_workers=1 the scenarios
+    run in this process.
+    """
+    arrays, category_names, department_names = load_cohort(path)
+    tasks = [
+        (name, {d: (dept.total_seats, dept.quotas) for d, dept in depts.items()})
+        for name, depts in scenarios.items()
+    ]
+
+    handles, specs = [], {}
+    try:
+        for key, array in arrays.items():
+            shm, specs[key] = _share(array)
+            handles.append(shm)
+        initargs = (specs, category_names, department_names)
+        if max_workers == 1:
+            _attach(*initargs)
+            results = [run_scenario(*t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_attach, initargs=initargs) as pool:
+                results = list(pool.map(run_scenario, *zip(*tasks))) if tasks else []
+    finally:
+        for shm in handles:
+            shm.close()
+            shm.unlink()
+    return dict(results)
+
+
+def load_scenarios(file_path):
+    with open(file_path) as f:
+        raw = json.load(f)
+    return {
+        name: {d: Department(d, spec["total_seats"], spec.get("quotas")) for d, spec in depts.items()}
+        for name, depts in raw.items()
+    }
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python simulation.py scenarios.json")
+        sys.exit(1)
+    print(json.dumps(simulate(load_scenarios(sys.argv[1])), indent=2))
@@ -18,3 +18,45 @@ function confirmApprove(){
 function confirmReject(){
   return confirm('Reject documents and cancel admission?');
 }
+
+// Background job progress on the dashboard
+function pollJob(box){
+  fetch(box.dataset.url).then(r => r.json()).then(job => {
+    document.getElementById('jobStage').textContent = job.status === 'failed' ? 'Failed: ' + job.error : job.stage;
+    document.getElementById('jobPercent').textContent = job.percent + '%';
+    const bar = document.getElementById('jobBar');
+    bar.style.width = job.percent + '%';
+    if(job.status === 'done'){
+      window.location = job.result_url;
+    } else if(job.status === 'failed'){
+      bar.classList.add('bg-danger');
+    } else {
+      setTimeout(() => pollJob(box), 1000);
+    }
+  });
+}
+document.addEventListener('DOMContentLoaded', function(){
+  const box = document.getElementById('jobProgress');
+  if(box){
+    pollJob(box);
+  }
+});
+
+// Student portal: reload when the application status changes. Unchanged
+// polls carry the last ETag and come back as an empty 304.
+function pollStatus(box, etag){
+  fetch(box.dataset.url, {cache: 'no-store', headers: {'If-None-Match': etag}}).then(r => {
+    const latest = r.headers.get('ETag');
+    if(r.status === 200 && latest && latest !== etag){
+      window.location.reload();
+      return;
+    }
+    setTimeout(() => pollStatus(box, latest || etag), 15000);
+  }).catch(() => setTimeout(() => pollStatus(box, etag), 60000));
+}
+document.addEventListener('DOMContentLoaded', function(){
+  const box = document.getElementById('applicantStatus');
+  if(box){
+    setTimeout(() => pollStatus(box, '"' + box.dataset.etag + '"'), 15000);
+  }
+});
@@ -1,254 +1,1319 @@
+import os
+import re
 import sqlite3
 import json
+import time
+import atexit
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from models import Applicant, Department
+from ranking import MeritIndex, calculate_final_score, MARKS_WEIGHT, ENTRANCE_WEIGHT
 from werkzeug.security import generate_password_hash
 
-DB_PATH = Path(__file__).parent / "admissions.db"
+# ADMISSIONS_DB points the app at another database, e.g. a scratch copy in tests
+DB_PATH = Path(os.environ.get("ADMISSIONS_DB") or Path(__file__).parent / "admissions.db")
+
+# Writable columns
+APPLICANT_FIELDS = (
+    "name", "age", "marks_12", "entrance_score", "preferences", "category",
+    "final_score", "rank", "allocated_department", "admission_status",
+    "document_status", "fee_status", "ocr_verified", "payment_id",
+    "marksheet_path", "scorecard_path", "category_rank", "ocr_status", "ocr_marks",
+)
+APPLICANT_COLUMNS = ("id",) + APPLICANT_FIELDS
+_APPLICANT_SELECT = ", ".join(APPLICANT_COLUMNS)
+# Columns that move an applicant in merit order
+MERIT_FIELDS = ("final_score", "age")
+DEPARTMENT_FIELDS = ("total_seats", "quotas", "filled_seats")
+# Columns shown on the public merit list; writing any of them bumps the
+# "merit_list" version, which keys the rendered pages
+MERIT_LIST_FIELDS = (
+    "name", "rank", "category_rank", "marks_12", "entrance_score", "final_score", "category", "admission_status",
+)
+JOB_COLUMNS = ("id", "kind", "lock_key", "status", "stage", "percent", "created_by", "error", "created_at", "updated_at")
+JOB_FIELDS = ("status", "stage", "percent", "error")
+
+# Sort key for merit order; unranked applicants sort last
+UNRANKED = 2147483647
+RANK_KEY = f"IFNULL(rank, {UNRANKED})"
+
+# Connections are cached per thread and per database file, so every helper in
+# this module reuses the same handle instead of reconnecting on each call.
+_local = threading.local()
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def get_connection(path=DB_PATH):
+    # A forked worker must not reuse the parent's handles
+    if getattr(_local, "pid", None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.conns = {}
+        _local.request_depth = 0
+    key = str(path)
+    conn = _local.conns.get(key)
+    if conn is None:
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        conn = sqlite3.connect(key, timeout=30, isolation_level=None)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        _local.conns[key] = conn
+    return conn
+
+
+@contextmanager
+def transaction(path=DB_PATH):
+    """
+    Runs the enclosed statements in one transaction. Nested calls join the
+    open transaction, and inside a request scope the commit is deferred to
+    end_request() so a whole request is written at once.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    if not _local.request_depth:
+        conn.commit()
+
+
+def begin_request():
+    get_connection()
+    _local.request_depth += 1
+
+
+def end_request(exc=None):
+    _local.request_depth = max(getattr(_local, "request_depth", 0) - 1, 0)
+    if _local.request_depth:
+        return
+    for conn in getattr(_local, "conns", {}).values():
+        if conn.in_transaction:
+            if exc is None:
+                conn.commit()
+            else:
+                conn.rollback()
+
+
+def close_connections():
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
 
 
 def init_db(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS departments (
-            name TEXT PRIMARY KEY,
-            total_seats INTEGER,
-            quotas TEXT,
-            filled_seats TEXT
+    with transaction(path) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS departments (
+                name TEXT PRIMARY KEY,
+                total_seats INTEGER,
+                quotas TEXT,
+                filled_seats TEXT
+            )
+            """
         )
-        """
-    )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS applicants (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            age INTEGER,
-            marks_12 REAL,
-            entrance_score REAL,
-            preferences TEXT,
-            category TEXT,
-            final_score REAL,
-            rank INTEGER,
-            allocated_department TEXT,
-            admission_status TEXT,
-            document_status TEXT,
-            fee_status TEXT,
-            ocr_verified INTEGER,
-            payment_id TEXT,
-            marksheet_path TEXT,
-            scorecard_path TEXT
+        # Seat occupancy, one row per (department, category). Seats are taken
+        # and given back with conditional UPDATEs (claim_seat/release_seat),
+        # so concurrent workers cannot over-fill a quota.
+        # departments.filled_seats is kept only for older databases.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS department_seats (
+                department TEXT,
+                category TEXT,
+                quota INTEGER NOT NULL DEFAULT 0,
+                filled INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (department, category)
+            )
+            """
         )
-        """
-    )
+        cur.execute("SELECT COUNT(*) FROM department_seats")
+        if cur.fetchone()[0] == 0:
+            cur.execute("SELECT name, quotas, filled_seats FROM departments")
+            for name, quotas_json, filled_json in cur.fetchall():
+                _write_seat_rows(conn, name, json.loads(quotas_json), json.loads(filled_json))
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            role TEXT,
-            applicant_id INTEGER,
-            FOREIGN KEY(applicant_id) REFERENCES applicants(id)
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS applicants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                age INTEGER,
+                marks_12 REAL,
+                entrance_score REAL,
+                preferences TEXT,
+                category TEXT,
+                final_score REAL,
+                rank INTEGER,
+                allocated_department TEXT,
+                admission_status TEXT,
+                document_status TEXT,
+                fee_status TEXT,
+                ocr_verified INTEGER,
+                payment_id TEXT,
+                marksheet_path TEXT,
+                scorecard_path TEXT
+            )
+            """
         )
-        """
-    )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS audit_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT,
-            action TEXT,
-            details TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT UNIQUE,
+                password TEXT,
+                role TEXT,
+                applicant_id INTEGER,
+                FOREIGN KEY(applicant_id) REFERENCES applicants(id)
+            )
+            """
         )
-        """
-    )
 
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS settings (
-            key TEXT PRIMARY KEY,
-            value TEXT
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS audit_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                username TEXT,
+                action TEXT,
+                details TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
         )
-        """
-    )
-    
-    # Default settings
-    cur.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('reg_open', 'true')")
-    cur.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('deadline', '2026-12-31T23:59')")
-    
-    # Create default admin if not exists
-    cur.execute("SELECT * FROM users WHERE username = 'admin'")
-    if not cur.fetchone():
-        admin_pass = generate_password_hash("admin123")
-        cur.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ("admin", admin_pass, "admin"))
 
-    conn.commit()
-    conn.close()
+        # Bumped by every write to a cached table; see VersionedCache
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS cache_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+        # One row per seat change in a counselling round
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS counselling_rounds (
+                round INTEGER NOT NULL,
+                applicant_id INTEGER NOT NULL,
+                from_department TEXT,
+                to_department TEXT,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (round, applicant_id)
+            )
+            """
+        )
+
+        # Seats freed or added since the last counselling round and still
+        # free; the next round starts its vacancy chains from these only
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS seat_vacancies (
+                department TEXT,
+                category TEXT,
+                PRIMARY KEY (department, category)
+            )
+            """
+        )
+        cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'seat_vacancy_update'")
+        if not cur.fetchone():
+            cur.execute(
+                """
+                CREATE TRIGGER seat_vacancy_insert AFTER INSERT ON department_seats
+                WHEN NEW.filled < NEW.quota
+                BEGIN
+                    INSERT OR IGNORE INTO seat_vacancies VALUES (NEW.department, NEW.category);
+                END
+                """
+            )
+            cur.execute(
+                """
+                CREATE TRIGGER seat_vacancy_update AFTER UPDATE ON department_seats
+                BEGIN
+                    INSERT OR IGNORE INTO seat_vacancies SELECT NEW.department, NEW.category
+                    WHERE NEW.filled < NEW.quota AND (NEW.filled < OLD.filled OR NEW.quota > OLD.quota);
+                    DELETE FROM seat_vacancies WHERE NEW.filled >= NEW.quota
+                    AND department = NEW.department AND category = NEW.category;
+                END
+                """
+            )
+            # Databases from before the triggers: every free seat is new
+            cur.execute("INSERT OR IGNORE INTO seat_vacancies SELECT department, category FROM department_seats WHERE filled < quota")
+
+        # Any write to users, from this module or not, bumps the "users"
+        # version that get_user_by_id's cache is keyed by
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cur.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS users_version_{event.lower()} AFTER {event} ON users
+                BEGIN
+                    INSERT INTO cache_versions (name, version, bumped_at)
+                    VALUES ('users', 1, (julianday('now') - 2440587.5) * 86400.0)
+                    ON CONFLICT(name) DO UPDATE SET version = version + 1, bumped_at = excluded.bumped_at;
+                END
+                """
+            )
+
+        # Background jobs, see jobs.py; status is queued, running, done or failed
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                stage TEXT,
+                percent INTEGER NOT NULL DEFAULT 0,
+                created_by TEXT,
+                error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        # At most one queued or running job of each kind, and of each lock_key,
+        # which kinds that must not run together share
+        _ensure_column(cur, "jobs", "lock_key", "TEXT")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active ON jobs(kind) WHERE status IN ('queued', 'running')")
+        cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_lock ON jobs(lock_key) WHERE status IN ('queued', 'running')")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+
+        # Outgoing email, sent in batches by notifications.OutboxSender.
+        # next_attempt_at (epoch seconds) is also the lease of a batch being sent
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recipient TEXT NOT NULL,
+                subject TEXT,
+                body TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                sent_at DATETIME
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+        # Marks read from an uploaded document, by SHA-256 of its bytes;
+        # marks is NULL when the document had none in it
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                content_hash TEXT PRIMARY KEY,
+                marks REAL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+            """
+        )
+
+        # Stamped with the "merit" version whenever final_score or age changes,
+        # so each process can catch its MeritIndex up with only the changed rows
+        _ensure_column(cur, "applicants", "merit_seq", "INTEGER NOT NULL DEFAULT 0")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_applicants_merit_seq ON applicants(merit_seq)")
+        _ensure_column(cur, "applicants", "category_rank", "INTEGER")
+        # Bumped by every write to an applicant row; the status API's ETag
+        _ensure_column(cur, "applicants", "row_version", "INTEGER NOT NULL DEFAULT 0")
+        # Last OCR run: Queued | Running | Verified | Mismatch | Unreadable | Missing | Error
+        _ensure_column(cur, "applicants", "ocr_status", "TEXT")
+        _ensure_column(cur, "applicants", "ocr_marks", "REAL")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_applicants_ocr_pending ON applicants(ocr_status) "
+            "WHERE ocr_status IN ('Queued', 'Running')"
+        )
+        # Epoch seconds of the last bump, for Last-Modified headers
+        _ensure_column(cur, "cache_versions", "bumped_at", "REAL NOT NULL DEFAULT 0")
+
+        # Secondary indexes for the dashboard filters; every one ends in the
+        # (rank, id) keyset so a filtered page is a single index range scan
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_applicants_rank ON applicants({RANK_KEY}, id)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_applicants_status ON applicants(admission_status, {RANK_KEY}, id)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_applicants_category ON applicants(category, {RANK_KEY}, id)")
+        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_applicants_department ON applicants(allocated_department, {RANK_KEY}, id)")
+
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_timestamp ON audit_logs(timestamp, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_username ON audit_logs(username, timestamp, id)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action, timestamp, id)")
+
+        # Default settings
+        cur.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('reg_open', 'true')")
+        cur.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('deadline', '2026-12-31T23:59')")
+
+        # Create default admin if not exists
+        cur.execute("SELECT * FROM users WHERE username = 'admin'")
+        if not cur.fetchone():
+            admin_pass = generate_password_hash("admin123")
+            cur.execute("INSERT INTO users (username, password, role) VALUES (?, ?, ?)", ("admin", admin_pass, "admin"))
+
+
+# Set AUDIT_SYNC=1 (or storage.AUDIT_SYNC = True before the first log) to
+# write every audit entry immediately, e.g. in tests
+AUDIT_SYNC = os.environ.get("AUDIT_SYNC") == "1"
+
+
+class AuditLogger:
+    """
+    Collects audit entries in memory and writes them in batches from a
+    background thread, once `batch_size` entries are queued or every
+    `flush_interval` seconds. Pending entries are flushed on shutdown.
+    """
+
+    def __init__(self, path=DB_PATH, batch_size=200, flush_interval=1.0, synchronous=False):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._pending = []
+        self._cond = threading.Condition()
+        # Held while a batch is written, so flush() also waits for a batch the
+        # writer thread has already taken
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def log(self, username, action, details):
+        # Timestamp at call time so batching does not shift the log order
+        entry = (username, action, details, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()))
+        if self.synchronous:
+            self._write([entry])
+            return
+        with self._cond:
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+            # Also restarts the writer in a forked worker, where it is not running
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                try:
+                    self._write(batch)
+                except sqlite3.Error:
+                    with self._cond:
+                        self._pending[:0] = batch
+                    raise
+
+    def close(self):
+        self._stopped = True
+        with self._cond:
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stopped:
+            with self._cond:
+                if len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Audit log flush failed, will retry: {e}")
+
+    def _write(self, batch):
+        with transaction(self.path) as conn:
+            conn.executemany(
+                "INSERT INTO audit_logs (username, action, details, timestamp) VALUES (?, ?, ?, ?)", batch
+            )
+
+
+_audit_loggers = {}
+_audit_loggers_lock = threading.Lock()
+
+
+def get_audit_logger(path=DB_PATH):
+    with _audit_loggers_lock:
+        logger = _audit_loggers.get(str(path))
+        if logger is None:
+            logger = _audit_loggers[str(path)] = AuditLogger(path, synchronous=AUDIT_SYNC)
+        return logger
+
+
+@atexit.register
+def close_audit_loggers():
+    for logger in list(_audit_loggers.values()):
+        logger.close()
+
+
+def _ensure_column(cur, table, column, decl):
+    # Adds a column that databases created by older versions lack
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 
 def log_action(username, action, details, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO audit_logs (username, action, details) VALUES (?, ?, ?)", (username, action, details))
-    conn.commit()
-    conn.close()
+    get_audit_logger(path).log(username, action, details)
 
 
-def get_audit_logs(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM audit_logs ORDER BY timestamp DESC LIMIT 100")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+def get_audit_logs(username=None, action=None, before=None, limit=100, path=DB_PATH):
+    """
+    Returns up to `limit` log rows, newest first. `before` is the
+    (timestamp, id) of the last row of the previous page.
+    """
+    # Show entries that are still queued, too
+    get_audit_logger(path).flush()
+    clauses, params = [], []
+    if username:
+        clauses.append("username = ?")
+        params.append(username)
+    if action:
+        clauses.append("action = ?")
+        params.append(action)
+    if before:
+        clauses.append("timestamp <= ? AND (timestamp < ? OR id < ?)")
+        params.extend([before[0], before[0], before[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = get_connection(path).execute(
+        f"SELECT * FROM audit_logs {where} ORDER BY timestamp DESC, id DESC LIMIT ?", params + [limit]
+    )
+    return cur.fetchall()
+
+
+def archive_audit_logs(before, cycle, path=DB_PATH):
+    """
+    Moves log rows older than `before` into the table audit_logs_archive_<cycle>
+    so the live table stays small. Returns the number of rows moved.
+    """
+    if not re.fullmatch(r"\w+", cycle):
+        raise ValueError(f"Invalid archive cycle name: {cycle}")
+    table = f"audit_logs_archive_{cycle}"
+    get_audit_logger(path).flush()
+    with transaction(path) as conn:
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} AS SELECT * FROM audit_logs WHERE 0")
+        conn.execute(f"INSERT INTO {table} SELECT * FROM audit_logs WHERE timestamp < ?", (before,))
+        cur = conn.execute("DELETE FROM audit_logs WHERE timestamp < ?", (before,))
+    return cur.rowcount
+
+
+def get_audit_archives(path=DB_PATH):
+    cur = get_connection(path).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'audit\\_logs\\_archive\\_%' ESCAPE '\\' ORDER BY name"
+    )
+    return [name[len("audit_logs_archive_"):] for (name,) in cur.fetchall()]
+
+
+class VersionedCache:
+    """
+    Keeps the result of `loader(path)` in memory until the version row
+    `name` in cache_versions changes. Writers bump the row in their own
+    transaction, so other worker processes see the change on their next
+    read at the cost of one primary-key lookup.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self._entries = {}
+
+    def get(self, path=DB_PATH):
+        conn = get_connection(path)
+        version = _get_version(conn, self.name)
+        entry = self._entries.get(str(path))
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        value = self.loader(path)
+        # Uncommitted data could still be rolled back, so only cache committed state
+        if not conn.in_transaction:
+            self._entries[str(path)] = (version, value)
+        return value
+
+
+def _get_version(conn, name):
+    row = conn.execute("SELECT version FROM cache_versions WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _bump_version(conn, name):
+    conn.execute(
+        "INSERT INTO cache_versions (name, version, bumped_at) VALUES (?, 1, ?) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1, bumped_at = excluded.bumped_at",
+        (name, time.time()),
+    )
+    return _get_version(conn, name)
+
+
+def get_cache_version(name, path=DB_PATH):
+    # (version, bumped_at epoch seconds) of a cache_versions row
+    row = get_connection(path).execute("SELECT version, bumped_at FROM cache_versions WHERE name = ?", (name,)).fetchone()
+    return tuple(row) if row else (0, 0.0)
+
+
+def _load_settings(path):
+    return dict(get_connection(path).execute("SELECT key, value FROM settings").fetchall())
+
+
+_settings_cache = VersionedCache("settings", _load_settings)
+
+
+def get_settings(path=DB_PATH):
+    return dict(_settings_cache.get(path))
 
 
 def get_setting(key, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT value FROM settings WHERE key = ?", (key,))
-    row = cur.fetchone()
-    conn.close()
-    return row[0] if row else None
+    return _settings_cache.get(path).get(key)
 
 
 def update_setting(key, value, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
-    conn.commit()
-    conn.close()
+    with transaction(path) as conn:
+        conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)", (key, value))
+        _bump_version(conn, "settings")
 
 
 def seed_departments(dept_map, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    for name, dept in dept_map.items():
-        cur.execute(
-            "INSERT OR REPLACE INTO departments(name, total_seats, quotas, filled_seats) VALUES (?, ?, ?, ?)",
-            (name, dept.total_seats, json.dumps(dept.quotas), json.dumps(dept.filled_seats)),
-        )
-    conn.commit()
-    conn.close()
+    with transaction(path) as conn:
+        for name, dept in dept_map.items():
+            conn.execute(
+                "INSERT OR REPLACE INTO departments(name, total_seats, quotas, filled_seats) VALUES (?, ?, ?, ?)",
+                (name, dept.total_seats, json.dumps(dept.quotas), json.dumps(dept.filled_seats)),
+            )
+            _write_seat_rows(conn, name, dept.quotas, dept.filled_seats)
+        _bump_version(conn, "departments")
+
+
+def _write_seat_rows(conn, name, quotas=None, filled=None):
+    # Upserts the seat rows of one department; a None argument leaves that column alone
+    updates = []
+    if quotas is not None:
+        updates.append("quota = excluded.quota")
+        conn.execute("UPDATE department_seats SET quota = 0 WHERE department = ?", (name,))
+    if filled is not None:
+        updates.append("filled = excluded.filled")
+    quotas, filled_map = quotas or {}, filled or {}
+    categories = list(dict.fromkeys(list(quotas) + list(filled_map)))
+    conn.executemany(
+        f"""
+        INSERT INTO department_seats (department, category, quota, filled) VALUES (?, ?, ?, ?)
+        ON CONFLICT(department, category) DO UPDATE SET {', '.join(updates)}
+        """,
+        [(name, c, quotas.get(c, 0), filled_map.get(c, 0)) for c in categories],
+    )
+
+
+def _load_department_defs(path):
+    cur = get_connection(path).execute("SELECT name, total_seats, quotas FROM departments")
+    return [(name, total, json.loads(quotas_json)) for (name, total, quotas_json) in cur.fetchall()]
+
+
+# Seat definitions rarely change; occupancy does, so it is always read live
+_departments_cache = VersionedCache("departments", _load_department_defs)
 
 
 def get_departments(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT name, total_seats, quotas, filled_seats FROM departments")
-    rows = cur.fetchall()
-    conn.close()
     depts = {}
-    for (name, total, quotas_json, filled_json) in rows:
-        d = Department(name, total, json.loads(quotas_json))
-        d.filled_seats = json.loads(filled_json)
-        depts[name] = d
+    for (name, total, quotas) in _departments_cache.get(path):
+        depts[name] = Department(name, total, dict(quotas))
+    for (name, category, filled) in get_connection(path).execute("SELECT department, category, filled FROM department_seats"):
+        if name in depts:
+            depts[name].filled_seats[category] = filled
     return depts
 
 
 def update_department(dept: Department, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE departments SET total_seats = ?, quotas = ?, filled_seats = ? WHERE name = ?",
-        (dept.total_seats, json.dumps(dept.quotas), json.dumps(dept.filled_seats), dept.name),
+    update_departments_bulk([dept], path=path)
+
+
+def update_departments_bulk(depts, fields=DEPARTMENT_FIELDS, path=DB_PATH):
+    # fields: subset of the department columns to write, e.g. ("quotas",).
+    # Seat counts are overwritten as given; use claim_seat/release_seat for
+    # changes that may race with another worker.
+    for f in fields:
+        if f not in DEPARTMENT_FIELDS:
+            raise ValueError(f"Unknown department column: {f}")
+    depts = list(depts)
+    columns = [f for f in fields if f != "filled_seats"]
+    with transaction(path) as conn:
+        if columns:
+            conn.executemany(
+                f"UPDATE departments SET {', '.join(f + ' = ?' for f in columns)} WHERE name = ?",
+                ([json.dumps(d.quotas) if f == "quotas" else d.total_seats for f in columns] + [d.name] for d in depts),
+            )
+            _bump_version(conn, "departments")
+        if "quotas" in fields or "filled_seats" in fields:
+            for d in depts:
+                _write_seat_rows(
+                    conn, d.name,
+                    quotas=d.quotas if "quotas" in fields else None,
+                    filled=d.filled_seats if "filled_seats" in fields else None,
+                )
+
+
+def claim_seat(department, category, path=DB_PATH):
+    """
+    Takes one seat of `category` in `department` if the quota allows it.
+    Returns False when the quota is already full.
+    """
+    with transaction(path) as conn:
+        cur = conn.execute(
+            "UPDATE department_seats SET filled = filled + 1 WHERE department = ? AND category = ? AND filled < quota",
+            (department, category),
+        )
+    return cur.rowcount == 1
+
+
+def release_seat(department, category, path=DB_PATH):
+    with transaction(path) as conn:
+        cur = conn.execute(
+            "UPDATE department_seats SET filled = filled - 1 WHERE department = ? AND category = ? AND filled > 0",
+            (department, category),
+        )
+    return cur.rowcount == 1
+
+
+def record_counselling_round(diff, path=DB_PATH):
+    """
+    Stores one round's assignment diff, [(applicant, from_dept, to_dept)],
+    and returns the new round number.
+    """
+    with transaction(path) as conn:
+        # Counted in cache_versions so rounds with no moves still get a number
+        round_no = _bump_version(conn, "counselling")
+        conn.executemany(
+            "INSERT INTO counselling_rounds (round, applicant_id, from_department, to_department) VALUES (?, ?, ?, ?)",
+            [(round_no, app.id, old, new) for (app, old, new) in diff],
+        )
+    return round_no
+
+
+def get_seat_vacancies(path=DB_PATH):
+    return get_connection(path).execute("SELECT department, category FROM seat_vacancies").fetchall()
+
+
+def clear_seat_vacancies(path=DB_PATH):
+    # Called by a counselling round once it has offered every vacancy
+    with transaction(path) as conn:
+        conn.execute("DELETE FROM seat_vacancies")
+
+
+def get_applied_categories(path=DB_PATH):
+    return [r[0] for r in get_connection(path).execute(
+        "SELECT DISTINCT category FROM applicants WHERE admission_status = 'Applied'"
+    )]
+
+
+def get_counselling_round(round_no, path=DB_PATH):
+    conn = get_connection(path)
+    return conn.execute(
+        "SELECT applicant_id, from_department, to_department FROM counselling_rounds WHERE round = ? ORDER BY applicant_id",
+        (round_no,),
+    ).fetchall()
+
+
+def enqueue_job(kind, created_by=None, lock_key=None, path=DB_PATH):
+    """
+    Queues a job of `kind` unless one of the same kind or `lock_key` (the
+    kind by default) is already queued or running. Returns (job_id, created);
+    job_id is the existing job when not created.
+    """
+    lock_key = lock_key or kind
+    with transaction(path) as conn:
+        try:
+            cur = conn.execute(
+                "INSERT INTO jobs (kind, lock_key, stage, created_by) VALUES (?, ?, 'Queued', ?)",
+                (kind, lock_key, created_by),
+            )
+            return cur.lastrowid, True
+        except sqlite3.IntegrityError:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE (kind = ? OR lock_key = ?) AND status IN ('queued', 'running')",
+                (kind, lock_key),
+            ).fetchone()
+            return row[0], False
+
+
+def claim_job(stale_after=600, path=DB_PATH):
+    """
+    Marks the oldest queued job running and returns it, or None. Running jobs
+    without an update for `stale_after` seconds lost their worker and are
+    failed first, so their kind can be queued again; live workers renew
+    updated_at well within that (see jobs.JobRunner).
+    """
+    with transaction(path) as conn:
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'Worker stopped', updated_at = CURRENT_TIMESTAMP "
+            "WHERE status = 'running' AND updated_at < datetime('now', ?)",
+            (f"-{int(stale_after)} seconds",),
+        )
+        row = conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', stage = 'Starting', updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (row[0],),
+        )
+        return get_job(row[0], path)
+
+
+def update_job(job_id, path=DB_PATH, **fields):
+    """
+    Updates a running job and renews its updated_at; with no fields it only
+    renews. Returns False when the job is no longer running, e.g. because
+    claim_job failed it as stale, and leaves it unchanged.
+    """
+    for f in fields:
+        if f not in JOB_FIELDS:
+            raise ValueError(f"Unknown job column: {f}")
+    assignments = "".join(f"{f} = ?, " for f in fields)
+    with transaction(path) as conn:
+        cur = conn.execute(
+            f"UPDATE jobs SET {assignments}updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+            (*fields.values(), job_id),
+        )
+    return cur.rowcount == 1
+
+
+def get_job(job_id, path=DB_PATH):
+    row = get_connection(path).execute(f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def queue_messages(messages, path=DB_PATH):
+    # messages: iterable of (recipient, subject, body)
+    with transaction(path) as conn:
+        conn.executemany("INSERT INTO outbox (recipient, subject, body) VALUES (?, ?, ?)", messages)
+
+
+def claim_outbox_batch(limit=50, lease=300, path=DB_PATH):
+    """
+    Takes up to `limit` due messages for sending and returns them as
+    (id, recipient, subject, body, attempts) rows. They stay leased for
+    `lease` seconds; if the sender dies they become due again after that.
+    """
+    now = time.time()
+    with transaction(path) as conn:
+        rows = conn.execute(
+            "SELECT id, recipient, subject, body, attempts FROM outbox "
+            "WHERE status IN ('pending', 'sending') AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET status = 'sending', next_attempt_at = ? WHERE id = ?",
+            [(now + lease, r[0]) for r in rows],
+        )
+    return rows
+
+
+def mark_outbox_sent(ids, path=DB_PATH):
+    with transaction(path) as conn:
+        conn.executemany(
+            "UPDATE outbox SET status = 'sent', attempts = attempts + 1, sent_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(i,) for i in ids],
+        )
+
+
+def mark_outbox_failed(failures, max_attempts=5, path=DB_PATH):
+    """
+    failures: (id, error, retry_at) tuples. Messages are retried at retry_at
+    until they reach max_attempts, then given up as 'failed'.
+    """
+    with transaction(path) as conn:
+        conn.executemany(
+            """
+            UPDATE outbox SET attempts = attempts + 1, last_error = ?, next_attempt_at = ?,
+                status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+            WHERE id = ?
+            """,
+            [(error, retry_at, max_attempts, i) for (i, error, retry_at) in failures],
+        )
+
+
+def get_outbox_counts(path=DB_PATH):
+    return dict(get_connection(path).execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+
+def queue_ocr(app_ids=None, path=DB_PATH):
+    """
+    Marks Selected applicants for OCR (all of them when app_ids is None),
+    skipping those already queued or running. Returns how many were queued.
+    """
+    sql = (
+        "UPDATE applicants SET ocr_status = 'Queued', row_version = row_version + 1 "
+        "WHERE admission_status = 'Selected' AND IFNULL(ocr_status, '') NOT IN ('Queued', 'Running')"
     )
-    conn.commit()
-    conn.close()
+    with transaction(path) as conn:
+        if app_ids is None:
+            return conn.execute(sql).rowcount
+        cur = conn.executemany(sql + " AND id = ?", ((i,) for i in app_ids))
+        return cur.rowcount
+
+
+def count_ocr_pending(path=DB_PATH):
+    # Applicants queued for OCR or taken by a job that has not finished them
+    return get_connection(path).execute(
+        "SELECT COUNT(*) FROM applicants WHERE ocr_status IN ('Queued', 'Running')"
+    ).fetchone()[0]
+
+
+def claim_ocr_batch(requeue=False, path=DB_PATH):
+    """
+    Marks every queued applicant Running and returns them as
+    (id, marks_12, marksheet_path) rows. With `requeue`, rows left Running
+    by a worker that stopped are taken again.
+    """
+    with transaction(path) as conn:
+        if requeue:
+            conn.execute("UPDATE applicants SET ocr_status = 'Queued' WHERE ocr_status = 'Running'")
+        rows = conn.execute(
+            "SELECT id, marks_12, marksheet_path FROM applicants WHERE ocr_status = 'Queued' ORDER BY id"
+        ).fetchall()
+        conn.execute("UPDATE applicants SET ocr_status = 'Running', row_version = row_version + 1 WHERE ocr_status = 'Queued'")
+    return rows
+
+
+def get_ocr_results(hashes, path=DB_PATH):
+    # {content_hash: marks} for the hashes that have been read before
+    hashes = list(hashes)
+    found = {}
+    conn = get_connection(path)
+    # Stay under SQLite's bound parameter limit
+    for i in range(0, len(hashes), 500):
+        chunk = hashes[i:i + 500]
+        found.update(conn.execute(
+            f"SELECT content_hash, marks FROM ocr_results WHERE content_hash IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall())
+    return found
+
+
+def save_ocr_result(content_hash, marks, path=DB_PATH):
+    with transaction(path) as conn:
+        conn.execute("INSERT OR REPLACE INTO ocr_results (content_hash, marks) VALUES (?, ?)", (content_hash, marks))
 
 
 def add_applicant(name, age, marks_12, entrance_score, preferences, category, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
     prefs_str = ",".join(preferences)
-    cur.execute(
-        """
-        INSERT INTO applicants(name, age, marks_12, entrance_score, preferences, category, final_score, rank, allocated_department, admission_status, document_status, fee_status, ocr_verified)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        (name, age, marks_12, entrance_score, prefs_str, category, 0.0, None, None, 'Applied', 'Pending', 'Unpaid', 0),
-    )
-    app_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    return get_applicant(app_id)
+    # Scored on registration so the applicant has a provisional rank right away
+    final_score = calculate_final_score(Applicant(None, name, age, marks_12, entrance_score, preferences, category))
+    with transaction(path) as conn:
+        merit_seq = _bump_version(conn, "merit")
+        _bump_version(conn, "merit_list")
+        cur = conn.execute(
+            """
+            INSERT INTO applicants(name, age, marks_12, entrance_score, preferences, category, final_score, rank, allocated_department, admission_status, document_status, fee_status, ocr_verified, merit_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (name, age, marks_12, entrance_score, prefs_str, category, final_score, None, None, 'Applied', 'Pending', 'Unpaid', 0, merit_seq),
+        )
+        app_id = cur.lastrowid
+    return get_applicant(app_id, path)
 
 
 def get_applicant(app_id, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM applicants WHERE id = ?",
+    cur = get_connection(path).execute(
+        f"SELECT {_APPLICANT_SELECT} FROM applicants WHERE id = ?",
         (app_id,)
     )
     row = cur.fetchone()
-    conn.close()
     if not row:
         return None
     return _row_to_applicant(row)
 
 
+# Fields of the student status API
+STATUS_FIELDS = ("admission_status", "rank", "category_rank", "allocated_department", "document_status", "fee_status")
+
+
+def get_applicant_version(app_id, path=DB_PATH):
+    # row_version only, so an unchanged poll costs one primary-key lookup
+    row = get_connection(path).execute("SELECT row_version FROM applicants WHERE id = ?", (app_id,)).fetchone()
+    return row[0] if row else None
+
+
+def get_applicant_status(app_id, path=DB_PATH):
+    row = get_connection(path).execute(
+        f"SELECT id, row_version, {', '.join(STATUS_FIELDS)} FROM applicants WHERE id = ?", (app_id,)
+    ).fetchone()
+    return dict(zip(("id", "row_version") + STATUS_FIELDS, row)) if row else None
+
+
 def get_all_applicants(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM applicants")
-    rows = cur.fetchall()
-    conn.close()
-    return [_row_to_applicant(r) for r in rows]
+    cur = get_connection(path).execute(f"SELECT {_APPLICANT_SELECT} FROM applicants")
+    return [_row_to_applicant(r) for r in cur]
 
 
 def get_waiting_list(path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM applicants WHERE admission_status = 'Waiting' ORDER BY rank"
+    cur = get_connection(path).execute(
+        f"SELECT {_APPLICANT_SELECT} FROM applicants WHERE admission_status = 'Waiting' ORDER BY rank"
+    )
+    return [_row_to_applicant(r) for r in cur]
+
+
+class ApplicantRow:
+    """
+    A partial applicant carrying only the selected columns. Values are
+    converted like on Applicant (preferences as a list, ocr_verified as bool),
+    and the object can be ranked, allocated and passed to
+    update_applicants_bulk() with the columns it holds.
+    """
+
+    __slots__ = APPLICANT_COLUMNS
+
+    def __init__(self, columns, values):
+        for column, value in zip(columns, values):
+            if column == "preferences":
+                value = value.split(",") if value else []
+            elif column == "ocr_verified":
+                value = bool(value)
+            elif column == "final_score":
+                value = value or 0.0
+            setattr(self, column, value)
+
+    def __repr__(self):
+        fields = ", ".join(f"{c}={getattr(self, c)!r}" for c in self.__slots__ if hasattr(self, c))
+        return f"ApplicantRow({fields})"
+
+
+def iter_applicants(columns=None, status=None, category=None, department=None, search=None,
+                    order_by_rank=False, chunk_size=1000, as_tuples=False, path=DB_PATH):
+    """
+    Yields ApplicantRow objects while reading the cursor `chunk_size` rows at
+    a time, so a full scan never holds the whole cohort. `columns` limits the
+    projection (id is always included, first). With `as_tuples` the raw
+    column tuples are yielded instead.
+    """
+    columns = tuple(dict.fromkeys(("id",) + tuple(columns or APPLICANT_COLUMNS)))
+    for c in columns:
+        if c not in APPLICANT_COLUMNS:
+            raise ValueError(f"Unknown applicant column: {c}")
+    clauses, params = _applicant_filters(status, category, department, search)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    order = f"ORDER BY {RANK_KEY}, id" if order_by_rank else ""
+    cur = get_connection(path).execute(f"SELECT {', '.join(columns)} FROM applicants {where} {order}", params)
+    while True:
+        rows = cur.fetchmany(chunk_size)
+        if not rows:
+            break
+        if as_tuples:
+            yield from rows
+        else:
+            for row in rows:
+                yield ApplicantRow(columns, row)
+
+
+def iter_waiting_list(columns=None, categories=None, chunk_size=1000, path=DB_PATH):
+    # categories: only the waiting candidates of these categories
+    return iter_applicants(columns, status="Waiting", category=list(categories) if categories else None,
+                           order_by_rank=True, chunk_size=chunk_size, path=path)
+
+
+def _applicant_filters(status=None, category=None, department=None, search=None):
+    # status and category also take a list or tuple of values
+    clauses, params = [], []
+    for column, value in (("admission_status", status), ("category", category)):
+        if isinstance(value, (list, tuple)):
+            clauses.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        elif value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if department:
+        clauses.append("allocated_department = ?")
+        params.append(department)
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        clauses.append("name LIKE ? ESCAPE '\\'")
+        params.append(f"%{escaped}%")
+    return clauses, params
+
+
+def query_applicants(status=None, category=None, department=None, search=None, after=None, limit=50, path=DB_PATH):
+    """
+    Returns one page of applicants in merit order plus the cursor for the
+    next page (None on the last page). `after` is the (rank_key, id) pair of
+    the last row already shown.
+    """
+    clauses, params = _applicant_filters(status, category, department, search)
+    if after:
+        # Spelled out instead of a row-value comparison so SQLite can seek the index
+        clauses.append(f"{RANK_KEY} >= ? AND ({RANK_KEY} > ? OR id > ?)")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = get_connection(path).execute(
+        f"SELECT {_APPLICANT_SELECT} FROM applicants {where} ORDER BY {RANK_KEY}, id LIMIT ?",
+        params + [limit + 1],
     )
     rows = cur.fetchall()
-    conn.close()
-    return [_row_to_applicant(r) for r in rows]
+    page = [_row_to_applicant(r) for r in rows[:limit]]
+    next_after = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_after = (last.rank if last.rank is not None else UNRANKED, last.id)
+    return page, next_after
 
 
-def update_applicant(app: Applicant, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    prefs_str = ",".join(app.preferences)
-    cur.execute(
+def count_applicants(status=None, category=None, department=None, search=None, path=DB_PATH):
+    clauses, params = _applicant_filters(status, category, department, search)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = get_connection(path).execute(f"SELECT COUNT(*) FROM applicants {where}", params)
+    return cur.fetchone()[0]
+
+
+def count_applicants_by_status(status=None, category=None, department=None, search=None, path=DB_PATH):
+    # {admission_status: count} over the filtered applicants, in one query
+    clauses, params = _applicant_filters(status, category, department, search)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur = get_connection(path).execute(f"SELECT admission_status, COUNT(*) FROM applicants {where} GROUP BY admission_status", params)
+    return dict(cur.fetchall())
+
+
+def get_merit_page(page, page_size=100, columns=MERIT_LIST_FIELDS, path=DB_PATH):
+    # One page (1-based) of the merit list, walked along idx_applicants_rank
+    columns = ("id",) + tuple(c for c in columns if c != "id")
+    rows = get_connection(path).execute(
+        f"SELECT {', '.join(columns)} FROM applicants ORDER BY {RANK_KEY}, id LIMIT ? OFFSET ?",
+        (page_size, (page - 1) * page_size),
+    ).fetchall()
+    return [ApplicantRow(columns, row) for row in rows]
+
+
+def get_merit_position(app_id, path=DB_PATH):
+    """0-based position of an applicant in merit-list order, or None."""
+    conn = get_connection(path)
+    row = conn.execute(f"SELECT {RANK_KEY} FROM applicants WHERE id = ?", (app_id,)).fetchone()
+    if row is None:
+        return None
+    return conn.execute(
+        f"SELECT COUNT(*) FROM applicants WHERE {RANK_KEY} <= ? AND ({RANK_KEY} < ? OR id < ?)",
+        (row[0], row[0], app_id),
+    ).fetchone()[0]
+
+
+def get_status_counts(path=DB_PATH):
+    cur = get_connection(path).execute(
+        "SELECT admission_status, COUNT(*) FROM applicants GROUP BY admission_status"
+    )
+    return dict(cur.fetchall())
+
+
+def get_occupancy(path=DB_PATH):
+    """
+    Seats held per department and category, counted from the applicants who
+    currently hold one: {"CS": {"General": 4, "OBC": 2}, ...}
+    """
+    cur = get_connection(path).execute(
         """
-        UPDATE applicants SET name=?, age=?, marks_12=?, entrance_score=?, preferences=?, category=?, final_score=?, rank=?, allocated_department=?, admission_status=?, document_status=?, fee_status=?, ocr_verified=?, payment_id=?, marksheet_path=?, scorecard_path=? WHERE id=?
-        """,
-        (
-            app.name,
-            app.age,
-            app.marks_12,
-            app.entrance_score,
-            prefs_str,
-            app.category,
-            app.final_score,
-            app.rank,
-            app.allocated_department,
-            app.admission_status,
-            app.document_status,
-            app.fee_status,
-            1 if app.ocr_verified else 0,
-            app.payment_id,
-            app.marksheet_path,
-            app.scorecard_path,
-            app.id,
-        ),
+        SELECT allocated_department, category, COUNT(*) FROM applicants
+        WHERE allocated_department IS NOT NULL AND admission_status IN ('Selected', 'Confirmed')
+        GROUP BY allocated_department, category
+        """
+    )
+    occupancy = {}
+    for dept, category, n in cur.fetchall():
+        occupancy.setdefault(dept, {})[category] = n
+    return occupancy
+
+
+def get_status_by_category(path=DB_PATH):
+    cur = get_connection(path).execute(
+        "SELECT category, admission_status, COUNT(*) FROM applicants GROUP BY category, admission_status"
     )
-    conn.commit()
-    conn.close()
+    breakdown = {}
+    for category, status, n in cur.fetchall():
+        breakdown.setdefault(category, {})[status] = n
+    return breakdown
+
+
+# One MeritIndex per database, with the "merit" version it has caught up to
+_merit_indexes = {}
+_merit_lock = threading.Lock()
+
+
+def get_current_rank(app_id, path=DB_PATH):
+    """
+    Live merit rank of an applicant, including registrations since the last
+    /generate. The in-process MeritIndex is caught up with the rows stamped
+    after its last sync, so a lookup costs O(changes * log n).
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        # Uncommitted scores must not leak into the shared index
+        row = conn.execute("SELECT final_score, age FROM applicants WHERE id = ?", (app_id,)).fetchone()
+        if not row:
+            return None
+        cur = conn.execute(
+            "SELECT COUNT(*) FROM applicants WHERE final_score > ?1 OR (final_score = ?1 AND (age > ?2 OR (age = ?2 AND id < ?3)))",
+            (row[0], row[1], app_id),
+        )
+        return cur.fetchone()[0] + 1
+    with _merit_lock:
+        index, synced = _merit_indexes.get(str(path), (MeritIndex(), -1))
+        version = _get_version(conn, "merit")
+        if version != synced:
+            cur = conn.execute("SELECT id, final_score, age FROM applicants WHERE merit_seq > ?", (synced,))
+            for (row_id, final_score, age) in cur:
+                index.upsert(row_id, final_score, age)
+            _merit_indexes[str(path)] = (index, version)
+        return index.rank_of(app_id)
+
+
+def rank_applicants_sql(path=DB_PATH):
+    """
+    Recomputes final_score, rank and category_rank for the whole cohort in
+    SQLite with one UPDATE ... FROM over ROW_NUMBER() windows, using the
+    weights and tie-break (score desc, age desc, then id) of
+    ranking.merit_arrays(). No rows are loaded into Python.
+    """
+    with transaction(path) as conn:
+        merit_seq = _bump_version(conn, "merit")
+        _bump_version(conn, "merit_list")
+        cur = conn.execute(
+            """
+            UPDATE applicants
+            SET final_score = r.score, rank = r.overall, category_rank = r.in_category,
+                merit_seq = CASE WHEN final_score IS NOT r.score THEN :seq ELSE merit_seq END,
+                row_version = row_version + (rank IS NOT r.overall OR category_rank IS NOT r.in_category)
+            FROM (
+                SELECT id, score,
+                       ROW_NUMBER() OVER (ORDER BY score DESC, age DESC, id) AS overall,
+                       ROW_NUMBER() OVER (PARTITION BY category ORDER BY score DESC, age DESC, id) AS in_category
+                FROM (SELECT id, age, category, marks_12 * :marks_w + entrance_score * :entrance_w AS score FROM applicants)
+            ) AS r
+            WHERE applicants.id = r.id
+            """,
+            {"seq": merit_seq, "marks_w": MARKS_WEIGHT, "entrance_w": ENTRANCE_WEIGHT},
+        )
+    return cur.rowcount
+
+
+def update_applicant(app: Applicant, path=DB_PATH):
+    update_applicants_bulk([app], path=path)
+
+
+class StaleApplicantError(RuntimeError):
+    # An applicant's admission_status changed after it was read
+    pass
+
+
+def update_applicants_bulk(applicants, fields=APPLICANT_FIELDS, expect_status=None, path=DB_PATH):
+    # fields: subset of the applicant columns to write, e.g. ("final_score", "rank").
+    # expect_status: admission_status every row must still have; otherwise
+    # StaleApplicantError is raised and the caller's transaction rolled back
+    for f in fields:
+        if f not in APPLICANT_FIELDS:
+            raise ValueError(f"Unknown applicant column: {f}")
+    applicants = list(applicants)
+    assignments = ", ".join(f + "=?" for f in fields)
+    guard = " AND admission_status=?" if expect_status else ""
+    with transaction(path) as conn:
+        stamp, merit = _merit_seq_assignment(conn, fields)
+        assignments += stamp
+        if any(f in MERIT_LIST_FIELDS for f in fields):
+            _bump_version(conn, "merit_list")
+        rows = (
+            [_applicant_value(a, f) for f in (*fields, *merit)] + [a.id] + ([expect_status] if guard else [])
+            for a in applicants
+        )
+        cur = conn.executemany(f"UPDATE applicants SET {assignments}, row_version = row_version + 1 WHERE id=?{guard}", rows)
+        if guard and cur.rowcount != len(applicants):
+            raise StaleApplicantError(f"{len(applicants) - cur.rowcount} applicants are no longer {expect_status}")
+
+
+def transition_applicants(ids, from_status, path=DB_PATH, **changes):
+    """
+    Sets `changes` on each applicant in `ids` whose admission_status is still
+    `from_status`; the others are skipped. Returns {id: (allocated_department,
+    category)} as they were before the change, for the applicants changed.
+    """
+    for f in changes:
+        if f not in APPLICANT_FIELDS or f in MERIT_FIELDS:
+            raise ValueError(f"Unknown applicant column: {f}")
+    assignments = "".join(f"{f} = ?, " for f in changes)
+    changed = {}
+    with transaction(path) as conn:
+        for app_id in ids:
+            row = conn.execute("SELECT allocated_department, category FROM applicants WHERE id = ?", (app_id,)).fetchone()
+            cur = conn.execute(
+                f"UPDATE applicants SET {assignments}row_version = row_version + 1 WHERE id = ? AND admission_status = ?",
+                (*changes.values(), app_id, from_status),
+            )
+            if cur.rowcount == 1:
+                changed[app_id] = tuple(row)
+        if changed and any(f in MERIT_LIST_FIELDS for f in changes):
+            _bump_version(conn, "merit_list")
+    return changed
+
+
+def update_applicant_columns(ids, columns, path=DB_PATH):
+    """
+    Column-oriented bulk write: `columns` maps a column name to a sequence
+    aligned with `ids`, e.g. {"final_score": scores, "rank": ranks}. NumPy
+    arrays are accepted.
+    """
+    for f in columns:
+        if f not in APPLICANT_FIELDS:
+            raise ValueError(f"Unknown applicant column: {f}")
+    values = [v.tolist() if hasattr(v, "tolist") else v for v in columns.values()]
+    ids = ids.tolist() if hasattr(ids, "tolist") else ids
+    assignments = ", ".join(f + "=?" for f in columns)
+    with transaction(path) as conn:
+        stamp, merit = _merit_seq_assignment(conn, columns)
+        assignments += stamp
+        if any(f in MERIT_LIST_FIELDS for f in columns):
+            _bump_version(conn, "merit_list")
+        merit_values = [v for f, v in zip(columns, values) if f in merit]
+        conn.executemany(
+            f"UPDATE applicants SET {assignments}, row_version = row_version + 1 WHERE id=?",
+            zip(*values, *merit_values, ids),
+        )
+
+
+def _merit_seq_assignment(conn, fields):
+    """
+    SET clause stamping merit_seq on the rows whose final_score or age
+    actually changes, so the MeritIndex only catches up on those; its
+    parameters are the new values of the returned merit fields, bound after
+    the written columns. SET expressions see the old row, which makes the
+    comparison work.
+    """
+    merit = [f for f in fields if f in MERIT_FIELDS]
+    if not merit:
+        return "", merit
+    changed = " OR ".join(f"{f} IS NOT ?" for f in merit)
+    return f", merit_seq = CASE WHEN {changed} THEN {_bump_version(conn, 'merit')} ELSE merit_seq END", merit
+
+
+def _applicant_value(app, field):
+    if field == "preferences":
+        return ",".join(app.preferences)
+    if field == "ocr_verified":
+        return 1 if app.ocr_verified else 0
+    return getattr(app, field)
 
 
 def _row_to_applicant(row):
-    (app_id, name, age, marks_12, entrance_score, prefs_str, category, final_score, rank, allocated_dept, status, doc_status, fee_status, ocr_v, pay_id, marksheet, scorecard) = row
+    (app_id, name, age, marks_12, entrance_score, prefs_str, category, final_score, rank, allocated_dept, status, doc_status, fee_status, ocr_v, pay_id, marksheet, scorecard, category_rank, ocr_status, ocr_marks) = row
     prefs = prefs_str.split(",") if prefs_str else []
     app = Applicant(app_id, name, age, marks_12, entrance_score, prefs, category)
     app.final_score = final_score or 0.0
@@ -261,31 +1326,68 @@ def _row_to_applicant(row):
     app.payment_id = pay_id
     app.marksheet_path = marksheet
     app.scorecard_path = scorecard
+    app.category_rank = category_rank
+    app.ocr_status = ocr_status
+    app.ocr_marks = ocr_marks
     return app
 
 
+class LRUCache:
+    # Small thread-safe LRU map whose entries also expire after `ttl` seconds
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+# User rows by (users version, id) for the login loader. Triggers bump the
+# version on every write to users, so all worker processes see the change
+# on their next request.
+_user_cache = LRUCache(maxsize=4096, ttl=300)
+
+
 def create_user(username, password, role, applicant_id=None, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
     hashed_pw = generate_password_hash(password)
-    cur.execute("INSERT INTO users (username, password, role, applicant_id) VALUES (?, ?, ?, ?)", (username, hashed_pw, role, applicant_id))
-    conn.commit()
-    conn.close()
+    with transaction(path) as conn:
+        cur = conn.execute("INSERT INTO users (username, password, role, applicant_id) VALUES (?, ?, ?, ?)", (username, hashed_pw, role, applicant_id))
+    return cur.lastrowid
 
 
 def get_user(username, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT id, username, password, role, applicant_id FROM users WHERE username = ?", (username,))
-    row = cur.fetchone()
-    conn.close()
-    return row
+    cur = get_connection(path).execute("SELECT id, username, password, role, applicant_id FROM users WHERE username = ?", (username,))
+    return cur.fetchone()
 
 
 def get_user_by_id(user_id, path=DB_PATH):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("SELECT id, username, password, role, applicant_id FROM users WHERE id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    conn = get_connection(path)
+    key = (str(path), _get_version(conn, "users"), int(user_id))
+    row = _user_cache.get(key)
+    if row is None:
+        row = conn.execute("SELECT id, username, password, role, applicant_id FROM users WHERE id = ?", (user_id,)).fetchone()
+        # Uncommitted rows could still be rolled back, as in VersionedCache
+        if row and not conn.in_transaction:
+            _user_cache.set(key, row)
     return row
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Tests that import webapp use a scratch database, never admissions.db
+os.environ["ADMISSIONS_DB"] = os.path.join(tempfile.mkdtemp(prefix="admissions-test-"), "admissions.db")
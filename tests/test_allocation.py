@@ -0,0 +1,91 @@
+import copy
+
+import pytest
+
+import storage as db
+from allocation import allocate_seats, allocate_seats_indexed
+from benchmarks.cohort import make_cohort, make_departments
+from models import Department
+from ranking import generate_merit_list
+
+
+def _outcome(applicants, departments, waiting):
+    return (
+        sorted((a.id, a.admission_status, a.allocated_department, a.document_status) for a in applicants),
+        {n: dict(d.filled_seats) for n, d in departments.items()},
+        [a.id for a in waiting],
+    )
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("seat_ratio", [0.02, 0.1, 0.5])
+def test_indexed_matches_reference(seed, seat_ratio):
+    departments = make_departments(400, seat_ratio)
+    cohort = make_cohort(400, departments, seed)
+    generate_merit_list(cohort)
+    # Some applicants list only departments that do not exist, some are no longer Applied
+    for a in cohort[::37]:
+        a.preferences = ["NONE"]
+    for a in cohort[5::41]:
+        a.admission_status = "Cancelled"
+
+    ref_apps, ref_depts, ref_waiting = copy.deepcopy((cohort, departments, []))
+    allocate_seats(ref_apps, ref_depts, ref_waiting)
+    allocate_seats_indexed(cohort, departments, waiting := [])
+
+    assert _outcome(cohort, departments, waiting) == _outcome(ref_apps, ref_depts, ref_waiting)
+
+
+def test_indexed_respects_failed_claims():
+    departments = make_departments(200, 0.1)
+    cohort = make_cohort(200, departments, 1)
+    generate_merit_list(cohort)
+    # A claim that fails for CS/General behaves like a quota that is already full
+    full = copy.deepcopy(departments)
+    full["CS"].quotas["General"] = full["CS"].filled_seats["General"]
+    ref_apps = copy.deepcopy(cohort)
+    allocate_seats(ref_apps, full, ref_waiting := [])
+
+    allocate_seats_indexed(cohort, departments, waiting := [], claim=lambda d, c: (d, c) != ("CS", "General"))
+
+    assert _outcome(cohort, departments, waiting)[0] == _outcome(ref_apps, full, ref_waiting)[0]
+
+
+@pytest.fixture
+def seats_db(tmp_path):
+    path = tmp_path / "seats.db"
+    db.init_db(path)
+    db.seed_departments({"CS": Department("CS", 2, {"General": 2})}, path=path)
+    yield path
+    db.close_connections()
+
+
+def test_claim_and_release_stop_at_quota_bounds(seats_db):
+    assert not db.release_seat("CS", "General", path=seats_db)
+    assert db.claim_seat("CS", "General", path=seats_db)
+    assert db.claim_seat("CS", "General", path=seats_db)
+    assert not db.claim_seat("CS", "General", path=seats_db)
+    assert not db.claim_seat("CS", "SC", path=seats_db)
+    assert db.get_departments(seats_db)["CS"].filled_seats["General"] == 2
+
+    assert db.release_seat("CS", "General", path=seats_db)
+    assert db.release_seat("CS", "General", path=seats_db)
+    assert not db.release_seat("CS", "General", path=seats_db)
+    assert db.get_departments(seats_db)["CS"].filled_seats["General"] == 0
+
+
+def test_transition_skips_applicants_that_moved_on(seats_db):
+    selected = db.add_applicant("A", 18, 90, 80, ["CS"], "General", path=seats_db)
+    app_id = selected.id
+    selected.admission_status, selected.allocated_department = "Selected", "CS"
+    db.update_applicants_bulk([selected], fields=("admission_status", "allocated_department"), path=seats_db)
+
+    cancel = dict(admission_status="Cancelled", allocated_department=None)
+    assert db.transition_applicants([app_id], "Selected", path=seats_db, **cancel) == {app_id: ("CS", "General")}
+    # A second reject finds the applicant Cancelled and changes nothing
+    assert db.transition_applicants([app_id], "Selected", path=seats_db, **cancel) == {}
+
+    # The stale Selected copy cannot be written back over the cancellation
+    with pytest.raises(db.StaleApplicantError):
+        db.update_applicants_bulk([selected], fields=("admission_status",), expect_status="Selected", path=seats_db)
+    assert db.get_applicant(app_id, path=seats_db).admission_status == "Cancelled"
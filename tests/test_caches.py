@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+import storage as db
+
+
+@pytest.fixture
+def cache_db(tmp_path):
+    path = tmp_path / "cache.db"
+    db.init_db(path)
+    yield path
+    db.close_connections()
+
+
+def test_versioned_cache_reloads_after_a_bump(cache_db):
+    loads = []
+
+    def loader(path):
+        loads.append(path)
+        return len(loads)
+
+    cache = db.VersionedCache("test", loader)
+    assert cache.get(cache_db) == 1
+    assert cache.get(cache_db) == 1
+
+    with db.transaction(cache_db) as conn:
+        db._bump_version(conn, "test")
+        # Read inside the writing transaction: loaded, but not kept
+        assert cache.get(cache_db) == 2
+    assert cache.get(cache_db) == 3
+    assert cache.get(cache_db) == 3
+    assert len(loads) == 3
+
+
+def test_settings_write_from_another_connection_is_seen(cache_db):
+    assert db.get_setting("portal_open", cache_db) is None
+    db.update_setting("portal_open", "yes", cache_db)
+    assert db.get_setting("portal_open", cache_db) == "yes"
+
+    # Another thread has its own connection, like another worker process
+    writer = threading.Thread(target=db.update_setting, args=("portal_open", "no", cache_db))
+    writer.start()
+    writer.join()
+    assert db.get_setting("portal_open", cache_db) == "no"
+
+
+def test_user_cache_sees_every_user_write(cache_db):
+    user_id = db.create_user("cached", "pw", "student", path=cache_db)
+    assert db.get_user_by_id(user_id, cache_db)[3] == "student"
+
+    # Writes that bypass create_user still invalidate, through the triggers
+    with db.transaction(cache_db) as conn:
+        conn.execute("UPDATE users SET role = 'admin' WHERE id = ?", (user_id,))
+    assert db.get_user_by_id(user_id, cache_db)[3] == "admin"
+
+    with db.transaction(cache_db) as conn:
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+    assert db.get_user_by_id(user_id, cache_db) is None
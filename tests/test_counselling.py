@@ -0,0 +1,86 @@
+import copy
+import random
+
+import pytest
+
+import storage as db
+from allocation import Counselling, allocate_seats
+from benchmarks.cohort import make_cohort, make_departments
+from models import Department
+from ranking import generate_merit_list
+
+
+def _fresh_allocation(cohort, departments):
+    """allocate_seats from empty seats for everyone still in counselling."""
+    apps = [copy.deepcopy(a) for a in cohort if a.admission_status != "Cancelled"]
+    for a in apps:
+        a.admission_status, a.allocated_department = "Applied", None
+    depts = {n: Department(n, d.total_seats, dict(d.quotas)) for n, d in departments.items()}
+    allocate_seats(apps, depts, [])
+    return sorted((a.id, a.admission_status, a.allocated_department) for a in apps)
+
+
+def _state(cohort):
+    return sorted((a.id, a.admission_status, a.allocated_department) for a in cohort if a.admission_status != "Cancelled")
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_rounds_match_fresh_allocation(seed):
+    departments = make_departments(300, 0.08)
+    cohort = make_cohort(300, departments, seed)
+    generate_merit_list(cohort)
+    rng = random.Random(seed)
+
+    counselling = Counselling(cohort, departments)
+    counselling.run_round()
+    assert _state(cohort) == _fresh_allocation(cohort, departments)
+
+    for _ in range(4):
+        freed = []
+        held = [a for a in cohort if a.admission_status == "Selected"]
+        for a in rng.sample(held, 5):
+            freed.append((a.allocated_department, a.category))
+            counselling.withdraw(a)
+        dept_name, category = rng.choice(list(departments)), rng.choice(["General", "OBC", "SC"])
+        counselling.add_seats(dept_name, category, 2)
+        freed.append((dept_name, category))
+
+        # A Counselling rebuilt from the same state, offered only the changed seats
+        rebuilt_apps, rebuilt_depts = copy.deepcopy((cohort, departments))
+        rebuilt = Counselling(rebuilt_apps, rebuilt_depts, vacancies=freed)
+
+        diff = counselling.run_round()
+        assert _state(cohort) == _fresh_allocation(cohort, departments)
+        assert all(old != new for _, old, new in diff)
+
+        rebuilt.run_round()
+        assert _state(rebuilt_apps) == _state(cohort)
+
+
+def test_seat_vacancy_triggers(tmp_path):
+    path = tmp_path / "seats.db"
+    db.init_db(path)
+    try:
+        db.seed_departments({"CS": Department("CS", 3, {"General": 2, "SC": 1})}, path=path)
+        # New seat rows are free seats
+        assert sorted(db.get_seat_vacancies(path=path)) == [("CS", "General"), ("CS", "SC")]
+        db.clear_seat_vacancies(path=path)
+
+        # Filling a quota drops it; freeing a seat records it again
+        assert db.claim_seat("CS", "SC", path=path)
+        assert db.claim_seat("CS", "General", path=path)
+        assert db.get_seat_vacancies(path=path) == []
+        assert db.claim_seat("CS", "General", path=path)
+        assert db.release_seat("CS", "General", path=path)
+        assert db.get_seat_vacancies(path=path) == [("CS", "General")]
+        assert db.claim_seat("CS", "General", path=path)
+        assert db.get_seat_vacancies(path=path) == []
+
+        # Added seats are vacancies, a full quota is not
+        dept = db.get_departments(path)["CS"]
+        dept.quotas["SC"] += 1
+        dept.total_seats += 1
+        db.update_departments_bulk([dept], fields=("total_seats", "quotas"), path=path)
+        assert db.get_seat_vacancies(path=path) == [("CS", "SC")]
+    finally:
+        db.close_connections()
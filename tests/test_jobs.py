@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import jobs
+import storage as db
+
+
+@pytest.fixture
+def jobs_db(tmp_path):
+    path = tmp_path / "jobs.db"
+    db.init_db(path)
+    yield path
+    db.close_connections()
+
+
+def _backdate(job_id, path):
+    with db.transaction(path) as conn:
+        conn.execute("UPDATE jobs SET updated_at = datetime('now', '-1 hour') WHERE id = ?", (job_id,))
+
+
+def test_enqueue_job_dedupes_active_jobs(jobs_db):
+    job_id, created = db.enqueue_job("generate", "admin", path=jobs_db)
+    assert created
+    assert db.enqueue_job("generate", "other", path=jobs_db) == (job_id, False)
+
+    assert db.claim_job(path=jobs_db)["id"] == job_id
+    assert db.enqueue_job("generate", path=jobs_db) == (job_id, False)
+
+    assert db.update_job(job_id, status="done", path=jobs_db)
+    new_id, created = db.enqueue_job("generate", path=jobs_db)
+    assert created and new_id != job_id
+
+
+def test_kinds_sharing_a_lock_key_are_not_queued_together(jobs_db):
+    allocate_id, created = db.enqueue_job("allocate", lock_key="seats", path=jobs_db)
+    assert created
+    assert db.enqueue_job("round", lock_key="seats", path=jobs_db) == (allocate_id, False)
+    # Other locks are unaffected
+    assert db.enqueue_job("generate", path=jobs_db)[1]
+
+    assert db.claim_job(path=jobs_db)["id"] == allocate_id
+    db.update_job(allocate_id, status="done", path=jobs_db)
+    round_id, created = db.enqueue_job("round", lock_key="seats", path=jobs_db)
+    assert created and round_id != allocate_id
+
+
+def test_stale_job_is_not_marked_done(jobs_db):
+    job_id, _ = db.enqueue_job("generate", path=jobs_db)
+    db.claim_job(path=jobs_db)
+    _backdate(job_id, jobs_db)
+
+    assert db.claim_job(path=jobs_db) is None
+    assert db.get_job(job_id, path=jobs_db)["status"] == "failed"
+    # The worker finishing late cannot overwrite the failure
+    assert not db.update_job(job_id, status="done", path=jobs_db)
+    assert db.get_job(job_id, path=jobs_db)["status"] == "failed"
+
+
+def test_heartbeat_keeps_a_long_job_alive(jobs_db):
+    seen = []
+
+    @jobs.handler("test-slow")
+    def slow(job, progress):
+        # No progress for "an hour"; only the heartbeat renews the job
+        _backdate(job["id"], jobs_db)
+        time.sleep(0.3)
+        seen.append(db.claim_job(stale_after=60, path=jobs_db))
+
+    try:
+        runner = jobs.JobRunner(heartbeat=0.05, path=jobs_db)
+        job_id, _ = db.enqueue_job("test-slow", path=jobs_db)
+        runner._execute(db.claim_job(path=jobs_db))
+    finally:
+        jobs._handlers.pop("test-slow")
+        jobs._lock_keys.pop("test-slow")
+
+    assert seen == [None]
+    assert db.get_job(job_id, path=jobs_db)["status"] == "done"
@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+from flask_mail import Mail
+
+import notifications
+import storage as db
+from notifications import OutboxSender
+
+
+class FakeMail:
+    """Stands in for flask_mail.Mail; recipients in `failing` raise on send."""
+
+    def __init__(self):
+        self.failing = set()
+        self.down = False
+        self.sent = []
+
+    @contextmanager
+    def connect(self):
+        if self.down:
+            raise ConnectionError("SMTP down")
+        yield self
+
+    def send(self, msg):
+        if msg.recipients[0] in self.failing:
+            raise ValueError("Mailbox unavailable")
+        self.sent.append(msg.recipients[0])
+
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    path = tmp_path / "outbox.db"
+    db.init_db(path)
+    clock = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    # OutboxSender registers itself as the sender notify() wakes
+    monkeypatch.setattr(notifications, "_sender", notifications._sender)
+    mail = FakeMail()
+    # Message() reads the default sender from the app
+    app = Flask(__name__)
+    Mail(app)
+    sender = OutboxSender(mail, context=app.app_context, max_attempts=3, backoff=10, path=path)
+    yield path, clock, mail, sender
+    db.close_connections()
+
+
+def _row(path, recipient):
+    return db.get_connection(path).execute(
+        "SELECT status, attempts, next_attempt_at FROM outbox WHERE recipient = ?", (recipient,)
+    ).fetchone()
+
+
+def test_failed_message_backs_off_and_gives_up(outbox):
+    path, clock, mail, sender = outbox
+    mail.failing.add("bad@x")
+    db.queue_messages([("ok@x", "S", "B"), ("bad@x", "S", "B")], path=path)
+
+    assert sender.send_batch() == 2
+    assert mail.sent == ["ok@x"]
+    assert _row(path, "ok@x")[:2] == ("sent", 1)
+    assert _row(path, "bad@x") == ("pending", 1, 1010.0)
+
+    # Not due before the backoff has passed, then retried with it doubled
+    clock[0] = 1009.0
+    assert sender.send_batch() == 0
+    clock[0] = 1010.0
+    assert sender.send_batch() == 1
+    assert _row(path, "bad@x") == ("pending", 2, 1030.0)
+
+    clock[0] = 1030.0
+    assert sender.send_batch() == 1
+    assert _row(path, "bad@x")[:2] == ("failed", 3)
+    clock[0] = 5000.0
+    assert sender.send_batch() == 0
+
+
+def test_connection_failure_retries_the_whole_batch(outbox):
+    path, clock, mail, sender = outbox
+    db.queue_messages([("a@x", "S", "B"), ("b@x", "S", "B")], path=path)
+
+    mail.down = True
+    assert sender.send_batch() == 2
+    assert _row(path, "a@x") == ("pending", 1, 1010.0)
+    assert _row(path, "b@x") == ("pending", 1, 1010.0)
+
+    mail.down = False
+    clock[0] = 1010.0
+    assert sender.send_batch() == 2
+    assert sorted(mail.sent) == ["a@x", "b@x"]
+    assert db.get_outbox_counts(path) == {"sent": 2}
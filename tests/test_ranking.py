@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+import storage as db
+from benchmarks.cohort import make_cohort, make_departments
+from ranking import generate_merit_list, merit_arrays
+
+
+@pytest.fixture
+def cohort():
+    cohort = make_cohort(600, make_departments(600), seed=3)
+    # Ties on score, and on score and age, to exercise every tie-break
+    for a, b in zip(cohort[::7], cohort[3::7]):
+        b.marks_12, b.entrance_score = a.marks_12, a.entrance_score
+        if b.id % 2:
+            b.age = a.age
+    return cohort
+
+
+def _reference(cohort):
+    generate_merit_list(cohort)
+    seen = {}
+    category_rank = {}
+    for a in cohort:
+        seen[a.category] = seen.get(a.category, 0) + 1
+        category_rank[a.id] = seen[a.category]
+    return {a.id: (a.final_score, a.rank, category_rank[a.id]) for a in cohort}
+
+
+def test_merit_arrays_matches_generate_merit_list(cohort):
+    rows = [(a.id, a.marks_12, a.entrance_score, a.age, a.category) for a in cohort]
+    ids, final_score, rank, category_rank = merit_arrays(rows)
+    expected = _reference(cohort)
+
+    got = {int(i): (float(s), int(r), int(c)) for i, s, r, c in zip(ids, final_score, rank, category_rank)}
+    assert {i: v[1:] for i, v in got.items()} == {i: v[1:] for i, v in expected.items()}
+    assert np.allclose([got[i][0] for i in expected], [v[0] for v in expected.values()])
+
+
+def test_rank_applicants_sql_matches_generate_merit_list(cohort, tmp_path):
+    path = tmp_path / "rank.db"
+    db.init_db(path)
+    try:
+        with db.transaction(path) as conn:
+            conn.executemany(
+                "INSERT INTO applicants(id, name, age, marks_12, entrance_score, preferences, category, "
+                "admission_status, document_status, fee_status, ocr_verified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 'Applied', 'Pending', 'Unpaid', 0)",
+                [(a.id, a.name, a.age, a.marks_12, a.entrance_score, ",".join(a.preferences), a.category)
+                 for a in cohort],
+            )
+        assert db.rank_applicants_sql(path=path) == len(cohort)
+        got = {
+            a.id: (a.final_score, a.rank, a.category_rank)
+            for a in db.iter_applicants(columns=("final_score", "rank", "category_rank"), path=path)
+        }
+    finally:
+        db.close_connections()
+    expected = _reference(cohort)
+
+    assert {i: v[1:] for i, v in got.items()} == {i: v[1:] for i, v in expected.items()}
+    assert np.allclose([got[i][0] for i in expected], [v[0] for v in expected.values()])
+
+
+def test_merit_seq_is_stamped_only_on_changed_scores(cohort, tmp_path):
+    path = tmp_path / "seq.db"
+    db.init_db(path)
+    try:
+        for a in cohort[:50]:
+            db.add_applicant(a.name, a.age, a.marks_12, a.entrance_score, a.preferences, a.category, path=path)
+        conn = db.get_connection(path)
+
+        def stamped():
+            version = db.get_cache_version("merit", path)[0]
+            return [r[0] for r in conn.execute("SELECT id FROM applicants WHERE merit_seq = ?", (version,))]
+
+        # Scores set on registration are already current
+        db.rank_applicants_sql(path=path)
+        assert stamped() == []
+
+        ids = [r[0] for r in conn.execute("SELECT id FROM applicants ORDER BY id LIMIT 2")]
+        scores = [r[0] for r in conn.execute("SELECT final_score FROM applicants ORDER BY id LIMIT 2")]
+        db.update_applicant_columns(ids, {"final_score": [scores[0], 1.0]}, path=path)
+        assert stamped() == [ids[1]]
+        assert db.get_current_rank(ids[1], path) == 50
+
+        applicant = db.get_applicant(ids[0], path)
+        db.update_applicants_bulk([applicant], fields=("final_score", "age"), path=path)
+        assert stamped() == []
+        applicant.age += 1
+        db.update_applicants_bulk([applicant], fields=("final_score", "age"), path=path)
+        assert stamped() == [ids[0]]
+    finally:
+        db.close_connections()
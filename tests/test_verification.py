@@ -0,0 +1,42 @@
+import copy
+import random
+
+import pytest
+
+from allocation import allocate_seats_indexed
+from benchmarks.cohort import make_cohort, make_departments
+from ranking import generate_merit_list
+from verification import reallocate_waiting, release_seats
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_release_seats_matches_repeated_reallocate_waiting(seed):
+    departments = make_departments(500, 0.05)
+    cohort = make_cohort(500, departments, seed)
+    generate_merit_list(cohort)
+    allocate_seats_indexed(cohort, departments, waiting := [])
+    # release_seats assumes the freed seats are the only free ones
+    for dept in departments.values():
+        dept.quotas = {c: dept.filled_seats.get(c, 0) for c in dept.quotas}
+
+    rng = random.Random(seed)
+    selected = [a for a in cohort if a.admission_status == "Selected"]
+    freed = []
+    for a in rng.sample(selected, 10):
+        freed.append((a.allocated_department, a.category))
+        a.admission_status, a.allocated_department = "Cancelled", None
+
+    ref_apps, ref_depts, ref_waiting = copy.deepcopy((cohort, departments, waiting))
+    for dept_name, category in freed:
+        ref_depts[dept_name].filled_seats[category] -= 1
+        reallocate_waiting(ref_depts, ref_waiting)
+
+    for dept_name, category in freed:
+        departments[dept_name].filled_seats[category] -= 1
+    promoted = release_seats(departments, waiting, freed)
+
+    state = lambda apps: sorted((a.id, a.admission_status, a.allocated_department) for a in apps)
+    assert state(cohort) == state(ref_apps)
+    assert {n: d.filled_seats for n, d in departments.items()} == {n: d.filled_seats for n, d in ref_depts.items()}
+    assert sorted(a.id for a in waiting) == sorted(a.id for a in ref_waiting)
+    assert len(promoted) == sum(a.admission_status == "Selected" for a in ref_apps) - (len(selected) - 10)
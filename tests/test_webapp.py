@@ -0,0 +1,114 @@
+import pytest
+
+import storage as db
+import webapp
+
+
+@pytest.fixture
+def client():
+    return webapp.app.test_client()
+
+
+def test_merit_page_is_conditional(client):
+    db.add_applicant("Merit A", 18, 90, 80, ["CS"], "General")
+    first = client.get("/merit")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    assert client.get("/merit", headers={"If-None-Match": etag}).status_code == 304
+    # A new applicant changes the list, so the old ETag no longer matches
+    db.add_applicant("Merit B", 18, 70, 60, ["CS"], "General")
+    changed = client.get("/merit", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert b"Merit B" in changed.data
+
+
+def test_merit_snapshot_is_not_served_once_stale(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(webapp, "MERIT_SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setitem(webapp.app.config, "MERIT_SNAPSHOT", True)
+    db.add_applicant("Snapshot A", 18, 90, 80, ["CS"], "General")
+    webapp.write_merit_snapshot()
+    (page,) = tmp_path.iterdir()
+    page.write_text("from the snapshot")
+    assert client.get("/merit").data == b"from the snapshot"
+
+    db.add_applicant("Snapshot B", 18, 70, 60, ["CS"], "General")
+    fresh = client.get("/merit")
+    assert b"Snapshot B" in fresh.data
+    # The next snapshot replaces the stale one
+    webapp.write_merit_snapshot()
+    assert [p.name for p in tmp_path.iterdir()] != [page.name]
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_status_api_answers_unchanged_polls_with_304(client):
+    applicant = db.add_applicant("Status A", 18, 90, 80, ["CS"], "General")
+    db.create_user(f"status{applicant.id}", "pw", "student", applicant.id)
+    client.post("/login", data={"username": f"status{applicant.id}", "password": "pw"})
+    url = f"/api/applicants/{applicant.id}/status"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.json["admission_status"] == "Applied"
+    etag = first.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    applicant.admission_status = "Waiting"
+    db.update_applicants_bulk([applicant], fields=("admission_status",))
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json["admission_status"] == "Waiting"
+    assert changed.headers["ETag"] != etag
+
+    # Students only see their own application
+    assert client.get(f"/api/applicants/{applicant.id + 1000}/status").status_code == 403
+
+
+def test_dashboard_ignores_a_malformed_cursor(client):
+    db.add_applicant("Dashboard A", 18, 99, 99, ["CS"], "General")
+    client.post("/login", data={"username": "admin", "password": "admin123"})
+    first = client.get("/dashboard?search=Dashboard")
+    assert b"Dashboard A" in first.data
+    for query in ("after_id=1", "after_id=1&after_rank=x", "after_rank=1"):
+        assert b"Dashboard A" in client.get(f"/dashboard?search=Dashboard&{query}").data
+
+
+def test_dashboard_counts_follow_status_changes(client, monkeypatch):
+    client.post("/login", data={"username": "admin", "password": "admin123"})
+    applicant = db.add_applicant("Counted A", 18, 50, 50, ["CS"], "General")
+    calls = []
+    count = db.count_applicants_by_status
+    monkeypatch.setattr(db, "count_applicants_by_status", lambda **f: calls.append(f) or count(**f))
+
+    client.get("/dashboard?search=Counted&status=Waiting")
+    client.get("/dashboard?search=Counted&status=Waiting")
+    assert len(calls) == 1
+
+    applicant.admission_status = "Waiting"
+    db.update_applicants_bulk([applicant], fields=("admission_status",))
+    client.get("/dashboard?search=Counted&status=Waiting")
+    assert len(calls) == 2
+    assert count(search="Counted", status="Waiting") == {"Waiting": 1}
+
+
+def test_verify_rejects_only_on_the_reject_action(client):
+    client.post("/login", data={"username": "admin", "password": "admin123"})
+    selected = db.add_applicant("Verify A", 18, 95, 95, ["CIVIL"], "General")
+    waiting = db.add_applicant("Verify B", 18, 60, 60, ["CIVIL"], "General")
+    other = db.add_applicant("Verify C", 18, 90, 90, ["CIVIL"], "SC")
+    assert db.claim_seat("CIVIL", "General")
+    selected.admission_status, selected.allocated_department = "Selected", "CIVIL"
+    waiting.admission_status = other.admission_status = "Waiting"
+    db.update_applicants_bulk([selected, waiting, other], fields=("admission_status", "allocated_department"))
+
+    for url in (f"/verify/{selected.id}", "/verify/bulk"):
+        client.post(url, data={"action": "bogus", "app_ids": [selected.id]})
+        assert db.get_applicant(selected.id).admission_status == "Selected"
+
+    client.post(f"/verify/{selected.id}", data={"action": "reject"})
+    assert db.get_applicant(selected.id).admission_status == "Cancelled"
+    # The freed General seat goes to the General candidate, not the better-ranked SC one
+    promoted = db.get_applicant(waiting.id)
+    assert (promoted.admission_status, promoted.allocated_department) == ("Selected", "CIVIL")
+    assert db.get_applicant(other.id).admission_status == "Waiting"
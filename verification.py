@@ -1,4 +1,8 @@
-def reallocate_waiting(departments, waiting_list):
+import heapq
+
+
+def reallocate_waiting(departments, waiting_list, claim=None):
+    # claim works as in allocation.allocate_seats
     # Sort waiting list by rank
     waiting_list.sort(key=lambda a: a.rank if a.rank else 999999)
     
@@ -7,6 +11,9 @@ def reallocate_waiting(departments, waiting_list):
             if pref in departments:
                 dept = departments[pref]
                 if dept.can_admit(candidate.category):
+                    if claim and not claim(pref, candidate.category):
+                        dept.filled_seats[candidate.category] = dept.quotas.get(candidate.category, 0)
+                        continue
                     candidate.admission_status = "Selected"
                     candidate.document_status = "Pending"
                     candidate.allocated_department = pref
@@ -16,6 +23,55 @@ def reallocate_waiting(departments, waiting_list):
     return False
 
 
+def release_seats(departments, waiting_list, freed, claim=None):
+    """
+    Fills freed seats from the waiting list in one pass. `freed` lists one
+    (department, category) pair per freed seat, in the order they were freed.
+    Candidates are kept in a heap per (department, category) they could take,
+    ordered by rank, so k seats cost O(k log n) after one pass over the list.
+    Each seat goes to the best-ranked waiting candidate of that category who
+    listed the department, as repeated reallocate_waiting() calls would when
+    no other seats are free. Returns the promoted candidates, which are
+    removed from `waiting_list`.
+    """
+    wanted = set(freed)
+    heaps = {}
+    for seq, candidate in enumerate(waiting_list):
+        rank_key = candidate.rank if candidate.rank else 999999
+        for pref in dict.fromkeys(candidate.preferences):
+            key = (pref, candidate.category)
+            if key in wanted:
+                heaps.setdefault(key, []).append((rank_key, seq, candidate))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+
+    promoted = []
+    for (dept_name, category) in freed:
+        dept = departments.get(dept_name)
+        heap = heaps.get((dept_name, category))
+        if dept is None or not dept.can_admit(category):
+            continue
+        # Drop candidates already promoted through another department's heap
+        while heap and heap[0][2].admission_status != "Waiting":
+            heapq.heappop(heap)
+        if not heap:
+            continue
+        if claim and not claim(dept_name, category):
+            dept.filled_seats[category] = dept.quotas.get(category, 0)
+            continue
+        _, _, candidate = heapq.heappop(heap)
+        candidate.admission_status = "Selected"
+        candidate.document_status = "Pending"
+        candidate.allocated_department = dept_name
+        dept.filled_seats[category] += 1
+        promoted.append(candidate)
+
+    if promoted:
+        promoted_ids = {id(c) for c in promoted}
+        waiting_list[:] = [c for c in waiting_list if id(c) not in promoted_ids]
+    return promoted
+
+
 def verify_documents_cli(applicants, departments, waiting_list):
     # This is for CLI usage
     for app in applicants:
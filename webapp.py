@@ -1,19 +1,22 @@
 import os
-import pandas as pd
-from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify
+import re
+import itertools
+from datetime import datetime, timezone
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify, session, stream_with_context, make_response
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_mail import Mail
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from models import Applicant, Department
-from ranking import generate_merit_list
-from allocation import allocate_seats
-from verification import reallocate_waiting
-from notifications import notify
-from admission_letter import generate_admission_pdf
-from ocr_utils import verify_applicant_marks
+from ranking import merit_arrays
+from allocation import allocate_seats_indexed, Counselling, FLOATING
+from verification import release_seats
+from notifications import notify, notify_many, OutboxSender
+from admission_letter import generate_admission_pdf, iter_letters_zip, LETTER_FIELDS
+from ocr_utils import content_hash, marks_agree, read_marks_many
 import storage as db
+import jobs
+from export import EXPORT_COLUMNS, DEFAULT_EXPORT_COLUMNS, select_columns, iter_csv, write_xlsx
 
 app = Flask(__name__)
 app.secret_key = "dev-secret"
@@ -21,16 +24,34 @@ app.secret_key = "dev-secret"
 # Configuration
 UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg'}
+DASHBOARD_PAGE_SIZE = 50
+LOG_PAGE_SIZE = 100
+MERIT_PAGE_SIZE = 100
+# When enabled, /generate and /allocate also write the public merit list as
+# static pages that /merit serves to visitors without querying SQLite
+app.config['MERIT_SNAPSHOT'] = False
+MERIT_SNAPSHOT_DIR = os.path.join('static', 'merit')
+# 'sql' ranks inside SQLite with window functions, 'numpy' ranks in-process
+app.config['RANKING_MODE'] = 'sql'
+# Threads running queued /generate and /allocate jobs in each web process
+app.config['JOB_WORKERS'] = 1
+# Processes reading documents in an OCR job; None uses one per CPU
+app.config['OCR_WORKERS'] = None
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Mail Configuration (Mock)
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
-app.config['MAIL_USE_TLS'] = True
+# MAIL_SERVER / MAIL_PORT / MAIL_USE_TLS can point at a local debugging SMTP
+# server, e.g. MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
 app.config['MAIL_USERNAME'] = 'your-email@gmail.com'
 app.config['MAIL_PASSWORD'] = 'your-password'
+app.config['MAIL_DEFAULT_SENDER'] = app.config['MAIL_USERNAME']
 mail = Mail(app)
+# Emails are queued by notify() and sent in batches from the outbox table
+outbox_sender = OutboxSender(mail, context=app.app_context)
 
 # Login Manager
 login_manager = LoginManager()
@@ -44,13 +65,30 @@ class User(UserMixin):
         self.role = role
         self.applicant_id = applicant_id
 
+# When enabled, login stores role and applicant_id in the signed session
+# cookie and load_user rebuilds the User from it without touching the users
+# table. Role changes then apply at the next login.
+app.config['USER_IN_SESSION'] = True
+
 @login_manager.user_loader
 def load_user(user_id):
+    info = session.get('user_info')
+    if app.config['USER_IN_SESSION'] and info and str(info['id']) == str(user_id):
+        return User(info['id'], info['username'], info['role'], info['applicant_id'])
     u = db.get_user_by_id(user_id)
     if u:
         return User(u[0], u[1], u[3], u[4])
     return None
 
+@app.before_request
+def open_db_scope():
+    db.begin_request()
+
+@app.teardown_request
+def close_db_scope(exc):
+    # Everything a request wrote is committed (or rolled back) here in one go
+    db.end_request(exc)
+
 db.init_db()
 
 # Seed departments if not present
@@ -76,6 +114,7 @@ def login():
         if u and check_password_hash(u[2], password):
             user_obj = User(u[0], u[1], u[3], u[4])
             login_user(user_obj)
+            session['user_info'] = {'id': u[0], 'username': u[1], 'role': u[3], 'applicant_id': u[4]}
             db.log_action(username, "Login", "User logged in successfully")
             if user_obj.role == 'admin':
                 return redirect(url_for("dashboard"))
@@ -89,12 +128,14 @@ def login():
 def logout():
     db.log_action(current_user.username, "Logout", "User logged out")
     logout_user()
+    session.pop('user_info', None)
     return redirect(url_for("login"))
 
 @app.route("/")
 def index():
-    reg_open = db.get_setting('reg_open') == 'true'
-    deadline = db.get_setting('deadline')
+    settings = db.get_settings()
+    reg_open = settings.get('reg_open') == 'true'
+    deadline = settings.get('deadline')
     return render_template("index.html", reg_open=reg_open, deadline=deadline)
 
 @app.route("/register", methods=["GET", "POST"])
@@ -131,7 +172,8 @@ def register():
         applicant = db.add_applicant(name, age, marks, entrance, prefs, category)
         applicant.marksheet_path = marksheet_path
         applicant.scorecard_path = scorecard_path
-        db.update_applicant(applicant)
+        # Only the changed columns, so the merit caches are not invalidated again
+        db.update_applicants_bulk([applicant], fields=("marksheet_path", "scorecard_path"))
 
         # Create student user account
         username = name.lower().replace(" ", "") + str(applicant.id)
@@ -149,8 +191,37 @@ def student_portal():
     if current_user.role != 'student':
         return redirect(url_for("dashboard"))
     
+    # Read before the row: a write in between only costs the page one extra reload
+    version = db.get_applicant_version(current_user.applicant_id)
     applicant = db.get_applicant(current_user.applicant_id)
-    return render_template("student_portal.html", applicant=applicant)
+    current_rank = db.get_current_rank(applicant.id)
+    return render_template("student_portal.html", applicant=applicant, current_rank=current_rank,
+                           status_etag=_status_etag(applicant.id, version))
+
+def _status_etag(app_id, version):
+    return f"app-{app_id}-v{version}"
+
+@app.route("/api/applicants/<int:app_id>/status")
+@login_required
+def applicant_status(app_id):
+    if current_user.role != 'admin' and current_user.applicant_id != app_id:
+        return jsonify({"error": "Forbidden"}), 403
+    # The ETag comes from row_version alone, so an unchanged poll is
+    # answered without decoding the row
+    version = db.get_applicant_version(app_id)
+    if version is None:
+        return jsonify({"error": "Not found"}), 404
+    etag = _status_etag(app_id, version)
+    if request.if_none_match.contains(etag):
+        response = make_response("", 304)
+    else:
+        status = db.get_applicant_status(app_id)
+        etag = _status_etag(app_id, status.pop("row_version"))
+        response = jsonify(status)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @app.route("/student/payment", methods=["GET", "POST"])
 @login_required
@@ -167,31 +238,52 @@ def payment():
         # Simulate payment processing
         applicant.fee_status = "Paid"
         applicant.payment_id = f"PAY-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-        db.update_applicant(applicant)
+        db.update_applicants_bulk([applicant], fields=("fee_status", "payment_id"))
         db.log_action(current_user.username, "Payment", f"Fee paid for {applicant.name}")
         flash("Payment successful! Your admission is now pending document verification.", "success")
         return redirect(url_for("student_portal"))
 
     return render_template("payment.html", applicant=applicant)
 
+# Dashboard stat card counts by (merit_list version, filters)
+_dashboard_counts = db.LRUCache(maxsize=256, ttl=3600)
+
 @app.route("/dashboard")
 @login_required
 def dashboard():
     if current_user.role != 'admin':
         return redirect(url_for("student_portal"))
 
-    search = request.args.get('search', '')
-    status_filter = request.args.get('status', '')
-    
-    applicants = db.get_all_applicants()
-    
-    if search:
-        applicants = [a for a in applicants if search.lower() in a.name.lower()]
-    if status_filter:
-        applicants = [a for a in applicants if a.admission_status == status_filter]
-        
+    filters = {
+        'search': request.args.get('search', ''),
+        'status': request.args.get('status', ''),
+        'category': request.args.get('category', ''),
+        'department': request.args.get('department', ''),
+    }
+    # A cursor with a missing or malformed half starts over at the first page
+    after = (request.args.get('after_rank', type=int), request.args.get('after_id', type=int))
+    if None in after:
+        after = None
+
+    applicants, next_after = db.query_applicants(after=after, limit=DASHBOARD_PAGE_SIZE, **filters)
+
+    # Stat cards count the filtered set, like the old in-memory filtering did.
+    # Status, name and category writes bump merit_list (allocated_department is
+    # only written along with admission_status), so the counts are cached by it
+    version = db.get_cache_version("merit_list")[0]
+    key = (version, tuple(sorted(filters.items())))
+    counts = _dashboard_counts.get(key)
+    if counts is None:
+        counts = db.count_applicants_by_status(**filters)
+        _dashboard_counts.set(key, counts)
+    total = sum(counts.values())
+    confirmed = counts.get('Confirmed', 0)
+    waiting = counts.get('Waiting', 0)
+
     departments_local = db.get_departments()
-    return render_template("dashboard.html", applicants=applicants, departments=departments_local)
+    return render_template("dashboard.html", applicants=applicants, departments=departments_local,
+                           filters=filters, next_after=next_after,
+                           total=total, confirmed=confirmed, waiting=waiting)
 
 @app.route("/admin/settings", methods=["GET", "POST"])
 @login_required
@@ -215,101 +307,287 @@ def admin_settings():
         db.log_action(current_user.username, "SettingsUpdate", "Admin updated system settings")
         flash("Settings updated successfully", "success")
 
-    settings = {
-        'reg_open': db.get_setting('reg_open'),
-        'deadline': db.get_setting('deadline')
-    }
+    settings = db.get_settings()
     departments = db.get_departments()
-    return render_template("admin_settings.html", settings=settings, departments=departments)
+    return render_template("admin_settings.html", settings=settings, departments=departments,
+                           export_columns=EXPORT_COLUMNS, default_columns=DEFAULT_EXPORT_COLUMNS)
 
 @app.route("/admin/logs")
 @login_required
 def admin_logs():
     if current_user.role != 'admin':
         return redirect(url_for("dashboard"))
-    logs = db.get_audit_logs()
-    return render_template("admin_logs.html", logs=logs)
+    filters = {
+        'username': request.args.get('username', ''),
+        'action': request.args.get('log_action', ''),
+    }
+    before = None
+    if request.args.get('before_id'):
+        before = (request.args.get('before_ts'), request.args.get('before_id', type=int))
+    logs = db.get_audit_logs(before=before, limit=LOG_PAGE_SIZE, **filters)
+    next_before = (logs[-1][4], logs[-1][0]) if len(logs) == LOG_PAGE_SIZE else None
+    return render_template("admin_logs.html", logs=logs, filters=filters, next_before=next_before,
+                           archives=db.get_audit_archives())
+
+@app.route("/admin/logs/archive", methods=["POST"])
+@login_required
+def archive_logs():
+    if current_user.role != 'admin':
+        return redirect(url_for("dashboard"))
+    before = request.form.get("before")
+    cycle = request.form.get("cycle", "").strip()
+    try:
+        moved = db.archive_audit_logs(before, cycle)
+    except ValueError as e:
+        flash(str(e), "danger")
+        return redirect(url_for("admin_logs"))
+    db.log_action(current_user.username, "ArchiveLogs", f"Archived {moved} log entries before {before} to cycle {cycle}")
+    flash(f"Archived {moved} log entries", "success")
+    return redirect(url_for("admin_logs"))
 
 @app.route("/admin/export")
 @login_required
 def export_data():
     if current_user.role != 'admin':
         return redirect(url_for("dashboard"))
-    
-    applicants = db.get_all_applicants()
-    data = []
-    for a in applicants:
-        data.append({
-            'ID': a.id,
-            'Name': a.name,
-            'Age': a.age,
-            '12th Marks': a.marks_12,
-            'Entrance': a.entrance_score,
-            'Category': a.category,
-            'Rank': a.rank,
-            'Status': a.admission_status,
-            'Department': a.allocated_department,
-            'Fee Status': a.fee_status
-        })
-    
-    df = pd.DataFrame(data)
-    export_path = os.path.join(UPLOAD_FOLDER, 'applicants_export.xlsx')
-    df.to_excel(export_path, index=False)
-    
-    db.log_action(current_user.username, "Export", "Admin exported applicant data to Excel")
-    return send_file(export_path, as_attachment=True)
+
+    # e.g. ?format=csv&status=Confirmed&columns=id&columns=name
+    columns = select_columns(request.args.getlist('columns'))
+    fmt = request.args.get('format', 'xlsx')
+    filters = {k: request.args.get(k) or None for k in ('status', 'category', 'department')}
+    rows = db.iter_applicants(columns=columns, order_by_rank=True, as_tuples=True, **filters)
+    if 'id' not in columns:
+        # iter_applicants always puts id first
+        rows = (r[1:] for r in rows)
+
+    db.log_action(current_user.username, "Export", f"Admin exported applicant data ({fmt})")
+    if fmt == 'csv':
+        return Response(
+            stream_with_context(iter_csv(rows, columns)),
+            mimetype="text/csv",
+            headers={"Content-Disposition": "attachment; filename=applicants_export.csv"},
+        )
+    return send_file(
+        write_xlsx(rows, columns),
+        as_attachment=True,
+        download_name="applicants_export.xlsx",
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
 @app.route("/generate")
 @login_required
 def generate():
     if current_user.role != 'admin':
         return redirect(url_for("dashboard"))
-    
-    applicants = db.get_all_applicants()
-    generate_merit_list(applicants)
-    for a in applicants:
-        db.update_applicant(a)
-    
-    db.log_action(current_user.username, "GenerateMerit", "Admin generated the merit list")
-    flash("Merit list generated", "info")
-    return redirect(url_for("merit_list"))
+    return _queue_job("generate", "Merit generation")
+
+@jobs.handler("generate")
+def run_generate(job, progress):
+    if app.config['RANKING_MODE'] == 'sql':
+        progress("Ranking", 10)
+        db.rank_applicants_sql()
+    else:
+        progress("Loading and ranking", 10)
+        rows = db.iter_applicants(columns=("marks_12", "entrance_score", "age", "category"), as_tuples=True)
+        ids, final_score, rank, category_rank = merit_arrays(rows)
+        progress("Saving ranks", 60)
+        db.update_applicant_columns(ids, {"final_score": final_score, "rank": rank, "category_rank": category_rank})
+
+    if app.config['MERIT_SNAPSHOT']:
+        progress("Publishing merit list", 90)
+        write_merit_snapshot()
+
+    db.log_action(job["created_by"], "GenerateMerit", "Admin generated the merit list")
+
+# Rendered public merit pages by (merit_list version, page)
+_merit_pages = db.LRUCache(maxsize=256, ttl=3600)
+
+def _merit_pages_count():
+    return max((db.count_applicants() + MERIT_PAGE_SIZE - 1) // MERIT_PAGE_SIZE, 1)
+
+def _render_merit_page(page, applicants=None, pages=None):
+    return render_template(
+        "merit.html",
+        applicants=db.get_merit_page(page, MERIT_PAGE_SIZE) if applicants is None else applicants,
+        page=page,
+        pages=pages or _merit_pages_count(),
+    )
 
 @app.route("/merit")
 def merit_list():
-    applicants = db.get_all_applicants()
-    applicants.sort(key=lambda x: x.rank if x.rank else 9999)
-    return render_template("merit.html", applicants=applicants)
+    app_id = request.args.get("app_id", type=int)
+    if app_id is not None:
+        position = db.get_merit_position(app_id)
+        if position is None:
+            flash(f"No application with ID {app_id}", "warning")
+            return redirect(url_for("merit_list"))
+        return redirect(url_for("merit_list", page=position // MERIT_PAGE_SIZE + 1, _anchor=f"app-{app_id}"))
+
+    page = max(request.args.get("page", 1, type=int), 1)
+    # Pages with a navbar for a signed-in user or pending messages are not shared
+    if current_user.is_authenticated or session.get('_flashes'):
+        return _render_merit_page(page)
+
+    version, bumped_at = db.get_cache_version("merit_list")
+    # A snapshot is only served while the merit list is still at the version it was written from
+    snapshot = _snapshot_name(page, version)
+    if app.config['MERIT_SNAPSHOT'] and os.path.exists(os.path.join(MERIT_SNAPSHOT_DIR, snapshot)):
+        return send_from_directory(MERIT_SNAPSHOT_DIR, snapshot)
+
+    html = _merit_pages.get((version, page))
+    if html is None:
+        html = _render_merit_page(page)
+        _merit_pages.set((version, page), html)
+    resp = make_response(html)
+    resp.set_etag(f"merit-{version}-{page}")
+    if bumped_at:
+        resp.last_modified = datetime.fromtimestamp(int(bumped_at), timezone.utc)
+    resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
+def _snapshot_name(page, version):
+    return f"page-{page}-v{version}.html"
+
+def write_merit_snapshot():
+    """
+    Renders every merit page, as a visitor sees it, into MERIT_SNAPSHOT_DIR,
+    tagged with the merit_list version it was read at.
+    """
+    os.makedirs(MERIT_SNAPSHOT_DIR, exist_ok=True)
+    # Read first: a write during the pass bumps the version past this
+    # snapshot, so a page mixing old and new rows is never served
+    version = db.get_cache_version("merit_list")[0]
+    pages = _merit_pages_count()
+    # One pass in merit order instead of a query per page
+    rows = db.iter_applicants(columns=db.MERIT_LIST_FIELDS, order_by_rank=True, chunk_size=MERIT_PAGE_SIZE)
+    with app.test_request_context("/merit"):
+        for page in range(1, pages + 1):
+            html = _render_merit_page(page, list(itertools.islice(rows, MERIT_PAGE_SIZE)), pages)
+            path = os.path.join(MERIT_SNAPSHOT_DIR, _snapshot_name(page, version))
+            with open(path + ".tmp", "w") as f:
+                f.write(html)
+            os.replace(path + ".tmp", path)
+    # Older snapshots can never be served again; newer ones belong to another job
+    for name in os.listdir(MERIT_SNAPSHOT_DIR):
+        match = re.fullmatch(r"page-(\d+)-v(\d+)\.html", name)
+        if match and (int(match[2]) < version or int(match[2]) == version and int(match[1]) > pages):
+            os.remove(os.path.join(MERIT_SNAPSHOT_DIR, name))
 
 @app.route("/allocate")
 @login_required
 def allocate():
     if current_user.role != 'admin':
         return redirect(url_for("dashboard"))
+    return _queue_job("allocate", "Seat allocation")
+
+# Allocation and counselling rounds both claim seats, so they share a lock
+@jobs.handler("allocate", lock_key="seats")
+def run_allocate(job, progress):
+    progress("Loading applicants", 5)
+    # Jobs run outside a request, so without this every claim would commit
+    # on its own and a failure would leave seats claimed that nobody holds.
+    # Applicants are read inside it, so none can be rejected in between
+    with db.transaction():
+        applicants = list(db.iter_applicants(columns=(
+            "name", "rank", "preferences", "category", "admission_status", "allocated_department", "document_status"
+        )))
+        departments_local = db.get_departments()
+        # Collects the applicants waitlisted in this run
+        waiting_list = []
+
+        progress("Allocating seats", 20)
+        # allocate_seats only changes applicants that are still "Applied"
+        pending = [a for a in applicants if a.admission_status == "Applied"]
+        # Seats are claimed one by one in the DB, so parallel workers cannot over-fill a quota
+        allocate_seats_indexed(applicants, departments_local, waiting_list, claim=db.claim_seat)
+        db.update_applicants_bulk(pending, fields=("admission_status", "allocated_department", "document_status"),
+                                  expect_status="Applied")
+
+    progress("Queueing notifications", 80)
+    notify_many("SELECTED", [a for a in applicants if a.admission_status == "Selected"], mail)
+
+    if app.config['MERIT_SNAPSHOT']:
+        progress("Publishing merit list", 90)
+        write_merit_snapshot()
+
+    db.log_action(job["created_by"], "AllocateSeats", "Admin ran seat allocation")
+
+job_runner = jobs.JobRunner(workers=app.config['JOB_WORKERS'], context=app.app_context)
+
+# Where the progress bar sends the admin once a job is done
+JOB_RESULT_PAGES = {"generate": "merit_list", "allocate": "dashboard", "round": "dashboard", "ocr": "verify"}
+
+def _queue_job(kind, label):
+    job_id, created = job_runner.submit(kind, current_user.username)
+    if created:
+        flash(f"{label} started in the background", "info")
+    elif db.get_job(job_id)["kind"] == kind:
+        flash(f"{label} is already in progress", "warning")
+    else:
+        flash(f"{label} has to wait for the running seat job to finish", "warning")
+    return redirect(url_for("dashboard", job=job_id))
 
-    applicants = db.get_all_applicants()
-    departments_local = db.get_departments()
-    waiting_list = db.get_waiting_list()
-
-    allocate_seats(applicants, departments_local, waiting_list)
-
-    for name, dept in departments_local.items():
-        db.update_department(dept)
-
-    for app_obj in applicants:
-        db.update_applicant(app_obj)
-        if app_obj.admission_status == "Selected":
-            notify("SELECTED", app_obj, mail)
-
-    db.log_action(current_user.username, "AllocateSeats", "Admin ran seat allocation")
-    flash("Seat allocation completed", "success")
-    return redirect(url_for("dashboard"))
+@app.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    if current_user.role != 'admin':
+        return jsonify({"error": "Forbidden"}), 403
+    job = db.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Not found"}), 404
+    job["result_url"] = url_for(JOB_RESULT_PAGES.get(job["kind"], "dashboard"))
+    return jsonify(job)
+
+@app.route("/allocate/round", methods=["POST"])
+@login_required
+def allocate_round():
+    if current_user.role != 'admin':
+        return redirect(url_for("dashboard"))
+    return _queue_job("round", "Counselling round")
+
+@jobs.handler("round", lock_key="seats")
+def run_round(job, progress):
+    progress("Loading candidates", 10)
+    # Taken first so no seat can be freed between reading and clearing the vacancies
+    with db.transaction():
+        # A vacancy chain stays within one category, so only the floating
+        # candidates of categories with a freed seat (or new applicants) can
+        # move. All of them are loaded: who moves is only known as the chain
+        # is followed, so a round costs O(floating candidates of the
+        # categories involved), not O(moves).
+        vacancies = db.get_seat_vacancies()
+        categories = sorted({c for _, c in vacancies} | set(db.get_applied_categories()))
+        applicants = list(db.iter_applicants(columns=(
+            "name", "rank", "preferences", "category", "admission_status", "allocated_department", "document_status"
+        ), status=list(FLOATING), category=categories)) if categories else []
+        applied = [a for a in applicants if a.admission_status == "Applied"]
+        progress("Offering vacant seats", 40)
+        # Selected candidates may float up into seats freed since the last round
+        counselling = Counselling(applicants, db.get_departments(), claim=db.claim_seat, release=db.release_seat,
+                                  vacancies=vacancies)
+        diff = counselling.run_round()
+        db.clear_seat_vacancies()
+
+        changed = {a.id: a for a in applied}
+        changed.update((app_obj.id, app_obj) for app_obj, _, _ in diff)
+        db.update_applicants_bulk(changed.values(), fields=("admission_status", "allocated_department", "document_status"))
+        round_no = db.record_counselling_round(diff)
+
+    progress("Queueing notifications", 80)
+    notify_many("SELECTED", [app_obj for app_obj, _, _ in diff], mail)
+
+    db.log_action(job["created_by"], "CounsellingRound", f"Round {round_no}: {len(diff)} seat changes")
 
 @app.route("/verify")
 @login_required
 def verify():
     if current_user.role != 'admin':
         return redirect(url_for("dashboard"))
-    selected = [a for a in db.get_all_applicants() if a.admission_status == "Selected"]
+    selected = list(db.iter_applicants(
+        columns=("name", "category", "marks_12", "allocated_department", "marksheet_path", "scorecard_path",
+                 "ocr_verified", "ocr_status", "ocr_marks"),
+        status="Selected",
+    ))
     return render_template("verify.html", selected=selected)
 
 @app.route("/verify/<int:app_id>", methods=["POST"])
@@ -319,54 +597,177 @@ def verify_action(app_id):
         return redirect(url_for("dashboard"))
         
     action = request.form.get("action")
-    candidate = db.get_applicant(app_id)
-    if not candidate:
-        flash("Applicant not found", "danger")
-        return redirect(url_for("verify"))
+    if action == "ocr":
+        return _queue_ocr([app_id])
+
+    # Read and changed in one transaction, so the candidate cannot move on in between
+    with db.transaction():
+        candidate = db.get_applicant(app_id)
+        if not candidate:
+            flash("Applicant not found", "danger")
+            return redirect(url_for("verify"))
+
+        if action == "approve":
+            done = approve_candidates([candidate])
+            message = (f"Documents verified for {candidate.name}", "success")
+        elif action == "reject":
+            done = reject_candidates([candidate])
+            message = (f"Documents rejected for {candidate.name}", "warning")
+        else:
+            flash(f"Unknown action: {action}", "danger")
+            return redirect(url_for("verify"))
+    if done:
+        flash(*message)
+    else:
+        flash(f"{candidate.name} is no longer Selected", "warning")
 
+    return redirect(url_for("verify"))
+
+@app.route("/verify/bulk", methods=["POST"])
+@login_required
+def verify_bulk():
+    if current_user.role != 'admin':
+        return redirect(url_for("dashboard"))
+
+    action = request.form.get("action")
+    if action == "ocr_all":
+        return _queue_ocr(None)
     if action == "ocr":
-        success, message = verify_applicant_marks(candidate)
-        if success:
-            candidate.ocr_verified = True
-            db.update_applicant(candidate)
-            flash(message, "success")
+        return _queue_ocr(request.form.getlist("app_ids", type=int))
+
+    if action not in ("approve", "reject"):
+        flash(f"Unknown action: {action}", "danger")
+        return redirect(url_for("verify"))
+
+    with db.transaction():
+        candidates = [c for c in (db.get_applicant(i) for i in request.form.getlist("app_ids", type=int))
+                      if c and c.admission_status == "Selected"]
+        if not candidates:
+            flash("No applicants selected", "warning")
+        elif action == "approve":
+            approved = approve_candidates(candidates)
+            flash(f"Documents verified for {len(approved)} applicants", "success")
         else:
-            flash(message, "warning")
+            rejected = reject_candidates(candidates)
+            flash(f"Documents rejected for {len(rejected)} applicants", "warning")
+    return redirect(url_for("verify"))
+
+def _queue_ocr(app_ids):
+    # app_ids None queues every Selected applicant
+    queued = db.queue_ocr(app_ids)
+    if not queued and not db.count_ocr_pending():
+        flash("No applicants to verify", "warning")
         return redirect(url_for("verify"))
+    # Submitted even when nothing new was queued: rows left Queued by a
+    # restart, or by a job that made its last claim just before they were
+    # queued, need a job too. A job that is still running takes them up.
+    job_id, _ = job_runner.submit("ocr", current_user.username)
+    if queued:
+        flash(f"OCR verification queued for {queued} applicants", "info")
+    else:
+        flash("OCR verification resumed for the applicants already queued", "info")
+    return redirect(url_for("verify", job=job_id))
+
+@jobs.handler("ocr")
+def run_ocr(job, progress):
+    # OCR jobs run one at a time, so rows still Running were left by a stopped worker
+    rows = db.claim_ocr_batch(requeue=True)
+    total = 0
+    while rows:
+        total += len(rows)
+        _run_ocr_batch(rows, progress)
+        # Applicants queued while this batch ran
+        rows = db.claim_ocr_batch()
+    db.log_action(job["created_by"], "OCRVerify", f"OCR verification run for {total} applicants")
+
+def _run_ocr_batch(rows, progress):
+    # Applicants by the content hash of their marksheet; a document uploaded
+    # more than once is read once, and one read before is not read again
+    by_hash, paths, missing = {}, {}, []
+    for app_id, form_marks, path in rows:
+        try:
+            digest = content_hash(path)
+        except (OSError, TypeError):
+            missing.append(app_id)
+            continue
+        by_hash.setdefault(digest, []).append((app_id, form_marks))
+        paths.setdefault(digest, path)
+    _save_ocr([(app_id, "Missing", None) for app_id in missing])
+
+    cached = db.get_ocr_results(by_hash)
+    _save_ocr([r for digest, marks in cached.items() for r in _ocr_outcomes(by_hash[digest], marks)])
+
+    todo = {paths[d]: d for d in by_hash if d not in cached}
+    progress(f"Reading {len(todo)} documents ({len(cached)} cached)", 0)
+    for i, (path, marks, error) in enumerate(read_marks_many(todo, app.config['OCR_WORKERS']), start=1):
+        digest = todo[path]
+        if error:
+            # Not cached: the next run tries this document again
+            print(f"OCR Error: {error}")
+            _save_ocr([(app_id, "Error", None) for app_id, _ in by_hash[digest]])
+        else:
+            db.save_ocr_result(digest, marks)
+            _save_ocr(_ocr_outcomes(by_hash[digest], marks))
+        progress(f"Read {i} of {len(todo)} documents", 100 * i / len(todo))
+
+def _ocr_outcomes(applicants, marks):
+    # (app_id, ocr_status, ocr_marks) for applicants whose document read as `marks`
+    if marks is None:
+        return [(app_id, "Unreadable", None) for app_id, _ in applicants]
+    return [(app_id, "Verified" if marks_agree(marks, form_marks) else "Mismatch", marks)
+            for app_id, form_marks in applicants]
+
+def _save_ocr(results):
+    if results:
+        ids, statuses, marks = zip(*results)
+        db.update_applicant_columns(ids, {
+            "ocr_status": statuses,
+            "ocr_marks": marks,
+            "ocr_verified": [s == "Verified" for s in statuses],
+        })
 
-    if action == "approve":
+def approve_candidates(candidates):
+    # Confirms the candidates still Selected and returns them
+    changed = db.transition_applicants([c.id for c in candidates], "Selected",
+                                       document_status="Verified", admission_status="Confirmed")
+    approved = [c for c in candidates if c.id in changed]
+    for candidate in approved:
         candidate.document_status = "Verified"
         candidate.admission_status = "Confirmed"
         notify("CONFIRMED", candidate, mail)
-        db.update_applicant(candidate)
         db.log_action(current_user.username, "ApproveDocs", f"Admin approved documents for {candidate.name}")
-        flash(f"Documents verified for {candidate.name}", "success")
-    else:
-        candidate.document_status = "Rejected"
-        candidate.admission_status = "Cancelled"
-        dept_name = candidate.allocated_department
-        if dept_name:
-            departments_db = db.get_departments()
-            if dept_name in departments_db:
-                departments_db[dept_name].filled_seats[candidate.category] -= 1
-                db.update_department(departments_db[dept_name])
+    return approved
+
+def reject_candidates(candidates):
+    # Cancels the candidates still Selected, frees their seats and returns them
+    with db.transaction():
+        changed = db.transition_applicants([c.id for c in candidates], "Selected", document_status="Rejected",
+                                           admission_status="Cancelled", allocated_department=None)
+        rejected = [c for c in candidates if c.id in changed]
+        freed = []
+        for candidate in rejected:
+            # Only a candidate this call cancelled gives its seat back, so a
+            # second reject of the same candidate frees nothing
+            dept_name, category = changed[candidate.id]
+            if dept_name and db.release_seat(dept_name, category):
+                freed.append((dept_name, category))
+            candidate.document_status = "Rejected"
+            candidate.admission_status = "Cancelled"
             candidate.allocated_department = None
-        notify("CANCELLED", candidate, mail)
-        db.update_applicant(candidate)
-        db.log_action(current_user.username, "RejectDocs", f"Admin rejected documents for {candidate.name}")
-
-        # Reallocate
-        departments_db = db.get_departments()
-        waiting = db.get_waiting_list()
-        if reallocate_waiting(departments_db, waiting):
-            for name, d in departments_db.items():
-                db.update_department(d)
-            for w in waiting:
-                db.update_applicant(w)
-
-        flash(f"Documents rejected for {candidate.name}", "warning")
-
-    return redirect(url_for("verify"))
+            notify("CANCELLED", candidate, mail)
+            db.log_action(current_user.username, "RejectDocs", f"Admin rejected documents for {candidate.name}")
+
+        # Refill every freed seat from the waiting list in one cascade
+        if freed:
+            # A freed seat only goes to a candidate of its own category
+            waiting = list(db.iter_waiting_list(
+                columns=("name", "rank", "preferences", "category", "admission_status", "allocated_department", "document_status"),
+                categories=sorted({category for _, category in freed}),
+            ))
+            promoted = release_seats(db.get_departments(), waiting, freed, claim=db.claim_seat)
+            db.update_applicants_bulk(promoted, fields=("admission_status", "allocated_department", "document_status"),
+                                      expect_status="Waiting")
+    return rejected
 
 @app.route("/stats")
 @login_required
@@ -375,20 +776,16 @@ def stats():
         return redirect(url_for("dashboard"))
     
     depts = db.get_departments()
+    occupancy = db.get_occupancy()
     labels = list(depts.keys())
-    filled = [sum(d.filled_seats.values()) for d in depts.values()]
+    filled = [sum(occupancy.get(name, {}).values()) for name in labels]
     total = [d.total_seats for d in depts.values()]
-    
-    applicants = db.get_all_applicants()
-    status_counts = {
-        "Applied": len([a for a in applicants if a.admission_status == "Applied"]),
-        "Selected": len([a for a in applicants if a.admission_status == "Selected"]),
-        "Confirmed": len([a for a in applicants if a.admission_status == "Confirmed"]),
-        "Waiting": len([a for a in applicants if a.admission_status == "Waiting"]),
-        "Cancelled": len([a for a in applicants if a.admission_status == "Cancelled"])
-    }
-    
-    return render_template("stats.html", labels=labels, filled=filled, total=total, status_counts=status_counts)
+
+    counts = db.get_status_counts()
+    status_counts = {s: counts.get(s, 0) for s in ("Applied", "Selected", "Confirmed", "Waiting", "Cancelled")}
+
+    return render_template("stats.html", labels=labels, filled=filled, total=total, status_counts=status_counts,
+                           departments=depts, occupancy=occupancy, by_category=db.get_status_by_category())
 
 @app.route("/download_letter/<int:app_id>")
 def download_letter(app_id):
@@ -400,5 +797,31 @@ def download_letter(app_id):
     pdf_buffer = generate_admission_pdf(applicant)
     return send_file(pdf_buffer, as_attachment=True, download_name=f"Admission_Letter_{applicant.name}.pdf", mimetype='application/pdf')
 
+@app.route("/admin/letters")
+@login_required
+def download_all_letters():
+    if current_user.role != 'admin':
+        return redirect(url_for("dashboard"))
+    confirmed = list(db.iter_applicants(columns=LETTER_FIELDS, status="Confirmed", order_by_rank=True))
+    db.log_action(current_user.username, "Letters", f"Admin downloaded {len(confirmed)} admission letters")
+    return Response(
+        iter_letters_zip(confirmed),
+        mimetype="application/zip",
+        headers={"Content-Disposition": "attachment; filename=Admission_Letters.zip"},
+    )
+
+@app.before_request
+def start_background_workers():
+    # Threads do not survive a fork, so each worker process starts its own;
+    # start() does nothing when they are already running
+    job_runner.start()
+    # Messages pending or waiting for a retry from before a restart
+    outbox_sender.start()
+
+start_background_workers()
+# Applicants still queued for OCR when the last process stopped
+if db.count_ocr_pending():
+    job_runner.submit("ocr")
+
 if __name__ == "__main__":
     app.run(debug=True)